@@ -0,0 +1,299 @@
+import io
+import os
+import copy
+import time
+import shutil
+import tarfile
+import zipfile
+import posixpath
+
+from transform import transform_bytes, write_notebook
+
+# Compression of the tar archives by the extension of their name
+tar_modes = {'.tar': 'w|', '.tar.gz': 'w|gz', '.tgz': 'w|gz', '.tar.bz2': 'w|bz2', '.tbz2': 'w|bz2',
+             '.tar.xz': 'w|xz', '.txz': 'w|xz'}
+
+def is_notebook_member(name):
+    """
+    Args:
+        name (str): The name of the archive member (with / as separator).
+
+    Returns:
+        bool: Whether the member is a notebook to transform (colabless_* notebooks are the result of a transformation).
+    """
+    return name.endswith('.ipynb') and not posixpath.basename(name).startswith('colabless_')
+
+def colabless_member_name(name):
+    """
+    Builds the name of the transformed notebook inside the archive, in the same folder as the original one.
+
+    Args:
+        name (str): The name of the original notebook member.
+
+    Returns:
+        str: The name of the 'colabless' version of the notebook.
+    """
+    folder, base = posixpath.split(name)
+    return posixpath.join(folder, 'colabless_' + base)
+
+def original_member_name(name):
+    """
+    Args:
+        name (str): The name of a colabless_* notebook member.
+
+    Returns:
+        str: The name of the notebook it is the transformation of.
+    """
+    folder, base = posixpath.split(name)
+    return posixpath.join(folder, base[len('colabless_'):])
+
+def archive_format(name):
+    """
+    Finds the format of an archive from its name.
+
+    Args:
+        name (str): The name or path of the archive.
+
+    Returns:
+        tuple: 'zip' or 'tar' and, for tar, the mode of tarfile.open used to write it (with its compression).
+    """
+    lower = str(name).lower()
+    if lower.endswith('.zip'):
+        return 'zip', None
+    for extension, mode in tar_modes.items():
+        if lower.endswith(extension):
+            return 'tar', mode
+    raise ValueError(f"Unknown archive format: {name} (it needs to be .zip, .tar, .tar.gz, .tar.bz2 or .tar.xz)")
+
+def _iter_zip(source):
+    """
+    Yields each member of a zip archive: its name, a file-like object to read it (None for directories)
+    and the original ZipInfo.
+    """
+    with zipfile.ZipFile(source) as zin:
+        for info in zin.infolist():
+            if info.is_dir():
+                yield info.filename, None, info
+            else:
+                with zin.open(info) as f:
+                    yield info.filename, f, info
+
+def _iter_tar(source):
+    """
+    Yields each member of a tar archive (compressed or not), reading it as a stream: its name, a file-like
+    object to read it (None for anything that is not a regular file) and the original TarInfo.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        tin = tarfile.open(source, 'r|*')
+    else:
+        tin = tarfile.open(fileobj=source, mode='r|*')
+    with tin:
+        for member in tin:
+            yield member.name, tin.extractfile(member) if member.isfile() else None, member
+            # The stream does not need the members already read, they would only fill the memory
+            tin.members = []
+
+def _member_names(source, source_kind):
+    """
+    Reads only the names of the members of an archive, without keeping their content.
+
+    Returns:
+        set: The names, or None if the archive is a stream that can only be read once.
+    """
+    if source_kind == 'zip':
+        # The names are in the central directory, at the end of the file
+        with zipfile.ZipFile(source) as zin:
+            names = set(zin.namelist())
+    elif isinstance(source, (str, os.PathLike)) or source.seekable():
+        names = {name for name, _, _ in _iter_tar(source)}
+    else:
+        return None
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    return names
+
+class _ArchiveWriter:
+    """
+    Writes the members of the output archive one at a time, keeping the metadata (dates, permissions...)
+    of the members of the input archive when it has the same format.
+
+    Args:
+        destination (str or file-like): Path or binary file-like object of the output archive.
+        kind (str): 'zip' or 'tar'.
+        tar_mode (str): The mode of tarfile.open for tar archives (e.g. 'w|gz').
+    """
+
+    def __init__(self, destination, kind, tar_mode=None):
+        self.kind = kind
+        if kind == 'zip':
+            self.archive = zipfile.ZipFile(destination, 'w', compression=zipfile.ZIP_DEFLATED)
+        elif isinstance(destination, (str, os.PathLike)):
+            self.archive = tarfile.open(destination, tar_mode)
+        else:
+            self.archive = tarfile.open(fileobj=destination, mode=tar_mode)
+
+    def _zip_info(self, name, original):
+        if isinstance(original, zipfile.ZipInfo):
+            info = zipfile.ZipInfo(name, original.date_time)
+            info.external_attr = original.external_attr
+            info.comment = original.comment
+        else:
+            # Zip archives cannot have dates before 1980
+            info = zipfile.ZipInfo(name, max(time.localtime(original.mtime)[:6], (1980, 1, 1, 0, 0, 0)))
+            info.external_attr = (original.mode & 0xFFFF) << 16
+            if original.isdir():
+                info.external_attr |= 0x10
+        info.compress_type = zipfile.ZIP_DEFLATED
+        return info
+
+    def _tar_info(self, name, original, size):
+        if isinstance(original, tarfile.TarInfo):
+            info = copy.copy(original)
+            info.name = name
+            if size is not None:
+                info.size = size
+        else:
+            info = tarfile.TarInfo(name.rstrip('/'))
+            info.size = size or 0
+            info.mtime = time.mktime(original.date_time + (0, 0, -1))
+            info.mode = (original.external_attr >> 16) & 0o7777 or (0o755 if original.is_dir() else 0o644)
+            if original.is_dir():
+                info.type = tarfile.DIRTYPE
+        return info
+
+    def add_file(self, name, original, fileobj=None, data=None):
+        """
+        Adds a member to the archive.
+
+        Args:
+            name (str): The name of the member.
+            original (ZipInfo or TarInfo): The member of the input archive with its metadata.
+            fileobj (file-like): Binary file with the content, copied in chunks (e.g. a member that passes through).
+            data (bytes): The content, if it is already in memory (e.g. a transformed notebook).
+
+        Returns:
+            None
+        """
+        if self.kind == 'zip':
+            if fileobj is None and data is None:
+                if isinstance(original, tarfile.TarInfo) and not original.isdir():
+                    # Links and devices of tar archives cannot be stored in a zip archive
+                    return
+                self.archive.writestr(self._zip_info(name.rstrip('/') + '/', original), b'')
+                return
+            info = self._zip_info(name, original)
+            size = len(data) if data is not None else getattr(original, 'size', getattr(original, 'file_size', 0))
+            with self.archive.open(info, 'w', force_zip64=size > zipfile.ZIP64_LIMIT) as f:
+                if data is not None:
+                    f.write(data)
+                else:
+                    shutil.copyfileobj(fileobj, f)
+            return
+
+        if data is not None:
+            info = self._tar_info(name, original, len(data))
+            self.archive.addfile(info, io.BytesIO(data))
+        else:
+            # tarfile needs the size before the content, which the original member already has
+            size = original.size if isinstance(original, tarfile.TarInfo) else getattr(original, 'file_size', None)
+            info = self._tar_info(name, original, size if fileobj is not None else None)
+            self.archive.addfile(info, fileobj)
+        # The written members are not needed anymore
+        self.archive.members = []
+
+    def close(self):
+        self.archive.close()
+
+def transform_archive(source, destination, remove_sections=[], cache=None, stream=False, writer=write_notebook,
+                      code_options=None, keep_sections=None, collect_installs=False, output_format=None):
+    """
+    Transforms the notebooks of a zip or tar archive and writes the colabless_* notebooks into another archive,
+    member by member, without extracting anything to disk. The rest of the members pass through unchanged,
+    so the memory needed depends on the largest notebook (the rest are copied in chunks).
+    Only the transformed notebooks are written, not the original ones. The notebooks that cannot be transformed are
+    copied unchanged and reported in the summary. A colabless_* notebook already in the archive is skipped (and reported
+    in the summary) when its original notebook is in the archive too, as it is replaced by the new transformation,
+    otherwise it passes through. The names of the members are read first to know it, except for tar archives read from
+    a stream, where only the notebooks before the colabless_* one are known (if its original notebook comes later,
+    both are written, and the new one replaces the old one when the archive is extracted).
+
+    Args:
+        source (str or file-like): Path or binary file-like object of the input archive
+            (zip archives need a seekable file; tar archives can be compressed with gzip, bzip2 or xz).
+        destination (str or file-like): Path or binary file-like object of the output archive.
+        remove_sections (list): List of section names to be removed from every notebook.
+        cache (ConversionCache): Optional cache with the already converted cells.
+        stream (bool): Whether to read the cells one at a time, skipping their outputs.
+        writer (callable): Function that writes each notebook.
+        code_options (dict): Extra options of code_to_cell (e.g. {'ast_globals': True}).
+        keep_sections (list): Optional list of section names to keep in every notebook, removing the rest of the numbered sections.
+        collect_installs (bool): Whether to add the removed installation commands to the summary of each notebook.
+        output_format (str): The extension of the output archive, e.g. '.zip' or '.tar.gz' (by default, the one
+            of the destination).
+
+    Returns:
+        list: A summary (dict) per notebook, in the order of the archive, with the same keys as the one of transform_batch
+        (the skipped colabless_* notebooks have the status 'skipped').
+    """
+    if isinstance(source, (str, os.PathLike)):
+        source_kind = 'zip' if zipfile.is_zipfile(source) else 'tar'
+    elif source.seekable():
+        source_kind = 'zip' if zipfile.is_zipfile(source) else 'tar'
+        source.seek(0)
+    else:
+        # Zip archives need to be read from the end, so a stream can only be a tar archive
+        source_kind = 'tar'
+    kind, tar_mode = archive_format(output_format or getattr(destination, 'name', destination))
+
+    names = _member_names(source, source_kind)
+    seen = set()
+    summary = []
+    members = _iter_zip(source) if source_kind == 'zip' else _iter_tar(source)
+    output = _ArchiveWriter(destination, kind, tar_mode)
+    try:
+        for name, fileobj, original in members:
+            if posixpath.normpath(name) == '.':
+                # The root folder of the archives created from inside the folder (e.g. tar -czf archive.tar.gz .)
+                continue
+            seen.add(name)
+            if fileobj is None or not name.endswith('.ipynb'):
+                output.add_file(name, original, fileobj=fileobj)
+                continue
+            if not is_notebook_member(name):
+                original_name = original_member_name(name)
+                if original_name in (names if names is not None else seen):
+                    # Result of a previous transformation, it is written again from its notebook
+                    summary.append({"notebook": name,
+                                    "output": None,
+                                    "status": "skipped",
+                                    "error": f"replaced by the transformation of {original_name}",
+                                    "seconds": 0.0})
+                else:
+                    output.add_file(name, original, fileobj=fileobj)
+                continue
+
+            start = time.perf_counter()
+            data = fileobj.read()
+            install_commands = [] if collect_installs else None
+            new_name = colabless_member_name(name)
+            try:
+                new_data = transform_bytes(data, remove_sections=remove_sections, cache=cache, stream=stream,
+                                           writer=writer, code_options=code_options, keep_sections=keep_sections,
+                                           install_commands=install_commands)
+                status, error = "success", None
+            except Exception as e:
+                # Kept as it is, so that the output archive has all the files of the input one
+                new_name, new_data = name, data
+                status, error = "failure", f"{type(e).__name__}: {e}"
+            output.add_file(new_name, original, data=new_data)
+            job = {"notebook": name,
+                   "output": new_name,
+                   "status": status,
+                   "error": error,
+                   "seconds": time.perf_counter() - start}
+            if install_commands is not None and status == "success":
+                job["install_commands"] = install_commands
+            summary.append(job)
+    finally:
+        output.close()
+    return summary
@@ -0,0 +1,433 @@
+import os
+import re
+import copy
+import json
+import time
+import timeit
+import platform
+import tempfile
+
+import nbformat
+
+from code_utils_one_cell import (classify_line, param_to_widget, code_to_cell, installation_regex,
+                                 param_regex, assignation_regex, function_regex, comment_after_param_regex,
+                                 float_regex)
+from param_parser import parse_param_line
+from markdown_utils import markdown_to_cell
+from sections import remove_section_list
+from synthetic import make_colab_notebook, param_lines
+from transform import transform_nb
+
+# Lines that are usually found in the code cells of a colab notebook
+sample_lines = [
+    "!pip install numpy",
+    "number_of_epochs = 100 #@param {type:\"number\"}",
+    "model_name = 'unet' #@param ['unet', 'resnet'] {allow-input: true}",
+    "x, y = load_data(path)",
+    "def train(model, epochs):",
+    "    history = model.fit(x, y, epochs=epochs)",
+    "    print('Training finished')",
+    "",
+    "# Plot the results",
+    "plt.plot(history.history['loss'])",
+]
+
+def legacy_classify_line(line):
+    """
+    Classifies a line the way code_to_cell did before classify_line existed,
+    running the (not compiled) regular expressions one after the other.
+    Parameters:
+        line (str): The line of code to classify.
+
+    Returns:
+        str: The kind of the line.
+    """
+    if re.search(installation_regex, line):
+        return 'install'
+    elif re.search(param_regex, line):
+        re.search(param_regex, line)
+        return 'param'
+    else:
+        if re.match(assignation_regex, line):
+            return 'assignment'
+        if re.match(function_regex, line):
+            return 'def'
+        return 'plain'
+
+def benchmark_line_classifier(num_lines=10000, repeat=5):
+    """
+    Measures the cost per line of classifying the lines of a big cell before
+    (legacy_classify_line) and after (classify_line) the single pass classifier.
+    Parameters:
+        num_lines (int): Number of lines of the synthetic cell.
+        repeat (int): Number of times the measure is repeated (the best one is kept).
+
+    Returns:
+        dict: Time in microseconds per line of each classifier.
+    """
+    lines = [sample_lines[i % len(sample_lines)] for i in range(num_lines)]
+
+    legacy_time = min(timeit.repeat(lambda: [legacy_classify_line(line) for line in lines], number=1, repeat=repeat))
+    new_time = min(timeit.repeat(lambda: [classify_line(line) for line in lines], number=1, repeat=repeat))
+
+    return {"legacy_us_per_line": legacy_time / num_lines * 1e6,
+            "classify_line_us_per_line": new_time / num_lines * 1e6}
+
+def benchmark_global_discovery(num_lines=5000, repeat=5):
+    """
+    Measures the time of converting a big code cell with params and another one without them, finding the
+    global names with the regular expressions on each line and parsing the cell with ast (code_to_cell with
+    ast_globals). Without params the names are not needed, so the ast mode does not parse the cell.
+    Parameters:
+        num_lines (int): Number of lines of the synthetic cell.
+        repeat (int): Number of times the measure is repeated (the best one is kept).
+
+    Returns:
+        dict: Time in milliseconds of each way of finding the global names.
+    """
+    code_lines = [line for line in sample_lines if 'install' not in line]
+    param_code = '\n'.join(code_lines[i % len(code_lines)] for i in range(num_lines))
+    code_lines = [line for line in code_lines if '#@param' not in line]
+    plain_code = '\n'.join(code_lines[i % len(code_lines)] for i in range(num_lines))
+
+    results = {}
+    for name, code in (("params", param_code), ("no_params", plain_code)):
+        regex_time = min(timeit.repeat(lambda: code_to_cell(code, False, 'function'), number=1, repeat=repeat))
+        ast_time = min(timeit.repeat(lambda: code_to_cell(code, False, 'function', ast_globals=True),
+                                     number=1, repeat=repeat))
+        results[f"{name}_regex_globals_ms"] = regex_time * 1e3
+        results[f"{name}_ast_globals_ms"] = ast_time * 1e3
+    return results
+
+def legacy_parse_param_line(line):
+    """
+    Parses a line with @param the way param_to_widget did before parse_param_line existed,
+    with param_regex and the regular expressions on the text after #@param.
+    Parameters:
+        line (str): The line of code.
+
+    Returns:
+        tuple: The same fields as the ParamInfo of parse_param_line, or None if the line does not follow the format.
+    """
+    match_param = re.search(param_regex, line)
+    if not match_param:
+        return None
+    post_param = match_param.group(3)
+    match_type = re.findall(r"{type:\s*\"(\w+)\".*}", post_param)
+    match_list = re.findall(r"(\[.*?\])", post_param)
+    match_slider = re.findall(rf"\s*min:({float_regex}),\s*max:({float_regex}),\s*step:({float_regex})", post_param)
+    return (match_param.group(1), match_param.group(2), post_param,
+            bool(re.match(comment_after_param_regex, post_param)),
+            match_type[0] if match_type else None,
+            match_list[0] if match_list else None,
+            bool(re.findall(r"{allow-input:\s*true}", post_param)),
+            match_slider[0] if match_slider else None)
+
+def adversarial_param_lines(size):
+    """
+    Generates lines with @param of about the given size that make the regular expressions backtrack
+    (and some long but well formed ones).
+    Parameters:
+        size (int): Approximate number of characters of each line.
+
+    Returns:
+        dict: The lines by name.
+    """
+    return {"repeated_assignments": 'a=' * (size // 2) + '#@param',
+            "spaces_before_param": 'x = ' + ' ' * size + '#@param',
+            "unclosed_lists": 'x = 1 #@param ' + '[' * size,
+            "unclosed_groups": 'x = 1 #@param [a]' + ' [b' * (size // 3),
+            "long_dropdown": 'x = "o0" #@param [' + ', '.join(f'"o{i}"' for i in range(size // 6)) + ']',
+            "long_string": 'x = "' + 'a' * size + '" #@param {type:"string"}'}
+
+def benchmark_param_parser(size=100000, legacy_size=1000, repeat=5):
+    """
+    Measures the time of parsing adversarial lines with @param with parse_param_line and with the
+    regular expressions (legacy_parse_param_line). The regular expressions take a time that grows with the
+    square or cube of the length of some lines, so they are measured on shorter lines.
+    Parameters:
+        size (int): Approximate number of characters of the lines parsed with parse_param_line.
+        legacy_size (int): Approximate number of characters of the lines parsed with both parsers.
+        repeat (int): Number of times the measure is repeated (the best one is kept).
+
+    Returns:
+        dict: Time in milliseconds of each parser on each line.
+    """
+    results = {}
+    for name, line in adversarial_param_lines(legacy_size).items():
+        results[f"{name}_{legacy_size}_legacy_ms"] = min(timeit.repeat(lambda: legacy_parse_param_line(line),
+                                                                       number=1, repeat=repeat)) * 1e3
+        results[f"{name}_{legacy_size}_ms"] = min(timeit.repeat(lambda: parse_param_line(line),
+                                                                number=1, repeat=repeat)) * 1e3
+    for name, line in adversarial_param_lines(size).items():
+        results[f"{name}_{size}_ms"] = min(timeit.repeat(lambda: parse_param_line(line), number=1, repeat=repeat)) * 1e3
+    return results
+
+class _BenchmarkCell:
+    """
+    Lightweight cell (only with source) used to benchmark the section functions.
+    """
+    def __init__(self, source):
+        self.source = source
+
+def make_section_cells(num_sections, cells_per_section=3):
+    """
+    Generates the cells and section localizer of a notebook with numbered sections of two levels
+    (1., 1.1., 1.2., ..., 2., 2.1., ...) with some code cells inside each section.
+    Parameters:
+        num_sections (int): Total number of numbered sections.
+        cells_per_section (int): Number of code cells after each heading.
+
+    Returns:
+        tuple: The list of cells and the section localizer.
+    """
+    cells = []
+    section_localizer = {}
+    subsections = 9
+    for i in range(num_sections):
+        top, sub = divmod(i, subsections + 1)
+        section = f"{top + 1}." if sub == 0 else f"{top + 1}.{sub}."
+        section_localizer[section] = len(cells)
+        cells.append(_BenchmarkCell(f"{'#' if sub == 0 else '##'} **{section} Section**\n"))
+        cells.extend(_BenchmarkCell("x = 1\n") for _ in range(cells_per_section))
+    return cells, section_localizer
+
+def legacy_remove_section(cells, section_localizer, section_to_rmv):
+    """
+    Removes a section the way remove_section did before the section index existed: it looks for the
+    next section that exists and renumbers the following sections, going through all the sections
+    for each removed one.
+    Parameters:
+        cells (list): A list of cells.
+        section_localizer (dict): A dictionary mapping section names to cell indices.
+        section_to_rmv (str): The name of the section to remove (with a next section at the same level).
+
+    Returns:
+        tuple: The updated list of cells and the updated section localizer.
+    """
+    def next_section_of(section):
+        parts = section.split('.')
+        parts[-2] = str(int(parts[-2]) + 1)
+        return '.'.join(parts)
+
+    # Find the next section that exists in the section localizer
+    next_section = next_section_of(section_to_rmv)
+    while next_section not in section_localizer:
+        next_section = next_section_of('.'.join(next_section.split('.')[:-2]) + '.')
+    num_removed_cells = section_localizer[next_section] - section_localizer[section_to_rmv]
+    updated_cells = cells[:section_localizer[section_to_rmv]] + cells[section_localizer[next_section]:]
+
+    updated_section_localizer = section_localizer.copy()
+    for section in section_localizer:
+        if section.startswith(section_to_rmv):
+            updated_section_localizer.pop(section)
+
+    # The numbers of sections after the removed section need to be updated
+    matching_section = os.path.commonprefix([section_to_rmv, next_section])
+    since_section_part = next_section.replace(matching_section, '', 1).split('.')
+    for section in section_localizer:
+        if section.startswith(matching_section):
+            actual_section_part = section.replace(matching_section, '', 1).split('.')
+            if actual_section_part[0] >= since_section_part[0]:
+                cell_id = updated_section_localizer.pop(section) - num_removed_cells
+                updated_section = matching_section + '.'.join([str(int(actual_section_part[0]) - 1)] + actual_section_part[1:])
+                updated_section_localizer[updated_section] = cell_id
+                updated_cells[cell_id].source = updated_cells[cell_id].source.replace(section, updated_section, 1)
+    return updated_cells, updated_section_localizer
+
+def benchmark_remove_sections(num_sections=500, num_removed=100, repeat=5):
+    """
+    Measures the time of removing many sections from a notebook with hundreds of numbered sections,
+    all together (remove_section_list) and one at a time with the algorithm before the section index
+    (legacy_remove_section).
+    Parameters:
+        num_sections (int): Total number of numbered sections of the notebook.
+        num_removed (int): Number of sections to remove.
+        repeat (int): Number of times the measure is repeated (the best one is kept).
+
+    Returns:
+        dict: Time in milliseconds of each way of removing the sections.
+    """
+    cells, section_localizer = make_section_cells(num_sections)
+    # Subsections spread over the notebook, except the last one of each section, whose next section
+    # legacy_remove_section does not find (it is the next top level section, and the numbers of the
+    # following ones are compared as text)
+    subsections = [section for section in section_localizer
+                   if section.count('.') == 2 and not section.endswith('.9.')]
+    step = max(1, len(subsections) // num_removed)
+    section_list = subsections[::step][:num_removed]
+
+    def remove_all():
+        fresh_cells = [_BenchmarkCell(cell.source) for cell in cells]
+        remove_section_list(fresh_cells, section_localizer, section_list)
+
+    def remove_one_by_one():
+        fresh_cells = [_BenchmarkCell(cell.source) for cell in cells]
+        current_cells, current_localizer = fresh_cells, section_localizer
+        for section in sorted(section_list, key=lambda x: [int(num) for num in x.split('.')[:-1]], reverse=True):
+            current_cells, current_localizer = legacy_remove_section(current_cells, current_localizer, section)
+
+    one_pass_time = min(timeit.repeat(remove_all, number=1, repeat=repeat))
+    one_by_one_time = min(timeit.repeat(remove_one_by_one, number=1, repeat=repeat))
+
+    return {"sections_removed": len(section_list),
+            "remove_section_list_ms": one_pass_time * 1e3,
+            "legacy_remove_section_ms": one_by_one_time * 1e3}
+
+def convert_cells(colab_nb):
+    """
+    Converts the cells of a notebook the same way transform_nb does (without removing sections).
+    Parameters:
+        colab_nb (NotebookNode): The original notebook.
+
+    Returns:
+        tuple: The converted cells and the section localizer.
+    """
+    section_localizer = {}
+    new_cells = []
+    ipywidget_imported = False
+    for cell in colab_nb.cells:
+        if cell.cell_type == "code":
+            cells, ipywidget_imported = code_to_cell(cell.source, ipywidget_imported, function_name='function')
+            new_cells.extend(cells)
+        elif cell.cell_type == "markdown":
+            new_text, section_localizer = markdown_to_cell(cell.source, section_localizer, len(new_cells))
+            new_cells.append(nbformat.v4.new_markdown_cell(new_text))
+    return new_cells, section_localizer
+
+def benchmark_stages(colab_nb, num_removed=5, repeat=5):
+    """
+    Measures the time of each stage of the conversion (param_to_widget, code_to_cell, markdown_to_cell,
+    remove_section_list and nbformat.write) and of the end-to-end transform_nb on the given notebook.
+    Parameters:
+        colab_nb (NotebookNode): The notebook to convert.
+        num_removed (int): Number of top level sections that are removed.
+        repeat (int): Number of times the measure is repeated (the best one is kept).
+
+    Returns:
+        dict: Time in milliseconds of each stage.
+    """
+    code_sources = [cell.source for cell in colab_nb.cells if cell.cell_type == "code"]
+    markdown_sources = [cell.source for cell in colab_nb.cells if cell.cell_type == "markdown"]
+    widget_lines = [line.format(i=i) for i, line in enumerate(param_lines)]
+
+    def run_param_to_widget():
+        for line in widget_lines:
+            param_to_widget(line)
+
+    def run_code_to_cell():
+        ipywidget_imported = False
+        for source in code_sources:
+            _, ipywidget_imported = code_to_cell(source, ipywidget_imported, function_name='function')
+
+    def run_markdown_to_cell():
+        section_localizer = {}
+        for cell_idx, source in enumerate(markdown_sources):
+            markdown_to_cell(source, section_localizer, cell_idx)
+
+    new_cells, section_localizer = convert_cells(colab_nb)
+    top_sections = [section for section in section_localizer if section.count('.') == 1]
+    section_list = top_sections[1:num_removed + 1]
+
+    def run_remove_section_list():
+        # The sources are renamed in place, so the cells are copied before each run
+        cells = [copy.copy(cell) for cell in new_cells]
+        remove_section_list(cells, dict(section_localizer), section_list)
+
+    new_nb = nbformat.v4.new_notebook()
+    new_nb.cells = new_cells
+
+    with tempfile.TemporaryDirectory() as folder:
+        path_original_nb = os.path.join(folder, "notebook.ipynb")
+        path_new_nb = os.path.join(folder, "colabless_notebook.ipynb")
+        nbformat.write(colab_nb, path_original_nb)
+
+        stages = {"param_to_widget": run_param_to_widget,
+                  "code_to_cell": run_code_to_cell,
+                  "markdown_to_cell": run_markdown_to_cell,
+                  "remove_section_list": run_remove_section_list,
+                  "nbformat_read": lambda: nbformat.read(path_original_nb, as_version=4),
+                  "nbformat_write": lambda: nbformat.write(new_nb, path_new_nb),
+                  "transform_nb": lambda: transform_nb(path_original_nb, path_new_nb, remove_sections=section_list)}
+
+        return {f"{name}_ms": min(timeit.repeat(stage, number=1, repeat=repeat)) * 1e3
+                for name, stage in stages.items()}
+
+def run_benchmarks(num_sections=50, depth=3, cells_per_section=2, lines_per_cell=50, num_removed=5,
+                   classifier_lines=10000, section_benchmark_sections=500, section_benchmark_removed=100,
+                   repeat=5, seed=0):
+    """
+    Runs all the benchmarks on synthetic notebooks and gathers their results, together with
+    the parameters and the environment, so that different runs can be compared.
+    Parameters:
+        num_sections (int): Number of numbered sections of the synthetic notebook.
+        depth (int): Maximum depth of the numbered sections.
+        cells_per_section (int): Number of code cells per section.
+        lines_per_cell (int): Number of lines per code cell.
+        num_removed (int): Number of top level sections removed in the stage benchmark.
+        classifier_lines (int): Number of lines of the line classifier benchmark.
+        section_benchmark_sections (int): Number of sections of the section removal benchmark.
+        section_benchmark_removed (int): Number of sections removed in the section removal benchmark.
+        repeat (int): Number of times each measure is repeated (the best one is kept).
+        seed (int): Seed of the synthetic notebook generator.
+
+    Returns:
+        dict: The environment, parameters and results of the benchmarks.
+    """
+    parameters = {"num_sections": num_sections, "depth": depth, "cells_per_section": cells_per_section,
+                  "lines_per_cell": lines_per_cell, "num_removed": num_removed,
+                  "classifier_lines": classifier_lines, "section_benchmark_sections": section_benchmark_sections,
+                  "section_benchmark_removed": section_benchmark_removed, "repeat": repeat, "seed": seed}
+
+    colab_nb = make_colab_notebook(num_sections=num_sections, depth=depth, cells_per_section=cells_per_section,
+                                   lines_per_cell=lines_per_cell, seed=seed)
+
+    results = {"stages": benchmark_stages(colab_nb, num_removed, repeat),
+               "line_classifier": benchmark_line_classifier(classifier_lines, repeat),
+               "global_discovery": benchmark_global_discovery(classifier_lines, repeat),
+               "remove_sections": benchmark_remove_sections(section_benchmark_sections,
+                                                            section_benchmark_removed, repeat),
+               "param_parser": benchmark_param_parser(repeat=repeat)}
+
+    environment = {"python": platform.python_version(),
+                   "platform": platform.platform(),
+                   "nbformat": nbformat.__version__,
+                   "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+    return {"environment": environment, "parameters": parameters, "results": results}
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmarks of the colab to docker conversion",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-o", "--output", help="JSON file where the results are saved")
+    parser.add_argument("--sections", help="number of numbered sections of the synthetic notebook", type=int, default=50)
+    parser.add_argument("--depth", help="maximum depth of the numbered sections", type=int, default=3)
+    parser.add_argument("--cells", help="number of code cells per section", type=int, default=2)
+    parser.add_argument("--lines", help="number of lines per code cell", type=int, default=50)
+    parser.add_argument("--removed", help="number of top level sections to remove", type=int, default=5)
+    parser.add_argument("--classifier-lines", help="number of lines of the line classifier benchmark", type=int, default=10000)
+    parser.add_argument("--section-benchmark-sections", help="number of sections of the section removal benchmark", type=int, default=500)
+    parser.add_argument("--section-benchmark-removed", help="number of sections removed in the section removal benchmark", type=int, default=100)
+    parser.add_argument("-r", "--repeat", help="number of repetitions of each measure", type=int, default=5)
+    parser.add_argument("--seed", help="seed of the synthetic notebook generator", type=int, default=0)
+    args = vars(parser.parse_args())
+
+    report = run_benchmarks(num_sections=args["sections"], depth=args["depth"], cells_per_section=args["cells"],
+                            lines_per_cell=args["lines"], num_removed=args["removed"],
+                            classifier_lines=args["classifier_lines"],
+                            section_benchmark_sections=args["section_benchmark_sections"],
+                            section_benchmark_removed=args["section_benchmark_removed"],
+                            repeat=args["repeat"], seed=args["seed"])
+
+    for group, results in report["results"].items():
+        for name, value in results.items():
+            print(f"{group}.{name}: {value:.3f}")
+
+    if args["output"]:
+        with open(args["output"], "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import json
+import time
+import sqlite3
+import hashlib
+
+import nbformat
+from nbformat.v4.nbbase import random_cell_id
+
+from code_utils_one_cell import code_to_cell
+from markdown_utils import markdown_to_cell
+
+def converter_version():
+    """
+    Computes a stamp of the current converter, based on the source code of the modules that
+    generate the cells. Any change in them invalidates the results stored in the cache.
+
+    Returns:
+        str: The version stamp of the converter.
+    """
+    import code_utils_one_cell
+    import markdown_utils
+    import param_parser
+
+    stamp = hashlib.sha256()
+    for module in (code_utils_one_cell, markdown_utils, param_parser):
+        with open(module.__file__, 'rb') as f:
+            stamp.update(f.read())
+    # The runtime is not imported (it needs ipywidgets), but its source is added to the cells
+    stamp.update(code_utils_one_cell.widget_runtime_code.encode())
+    return stamp.hexdigest()[:16]
+
+class ConversionCache:
+    """
+    Persistent cache (stored in a SQLite database) of the cells generated by code_to_cell and markdown_to_cell.
+    The entries are addressed by the hash of the cell source, the inputs of the conversion and the converter
+    version, and the least recently used ones are evicted when the size of the cache exceeds max_bytes.
+    The total size is kept in a metadata row, so that it does not need to be summed on every write, and the
+    accesses of the hits are only written by flush (e.g. once per notebook), so reading from the cache does not
+    take the write lock of the database.
+
+    Args:
+        path (str): Path of the SQLite database file.
+        max_bytes (int): Maximum size of the stored results, in bytes.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version = converter_version()
+        self.hits = 0
+        self.misses = 0
+        # Time of the last access of the entries read since the last flush
+        self.pending_access = {}
+
+        # Several processes of the batch mode can share the same database
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS cells ("
+                                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                                "size INTEGER NOT NULL, last_access REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS cells_last_access ON cells (last_access)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # The databases created before the metadata table get their total size once
+        self.connection.execute("INSERT OR IGNORE INTO metadata (name, value) "
+                                "SELECT 'bytes', COALESCE(SUM(size), 0) FROM cells")
+        self.connection.commit()
+
+    def make_key(self, kind, source, *inputs):
+        """
+        Builds the key of an entry of the cache.
+
+        Args:
+            kind (str): The converter that generated the entry ('code' or 'markdown').
+            source (str): The source of the original cell.
+            *inputs: The rest of the inputs of the converter that change its result.
+
+        Returns:
+            str: The key of the entry.
+        """
+        return hashlib.sha256(json.dumps([self.version, kind, source, inputs]).encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Gets the value of an entry of the cache, recording its last access (written by flush).
+
+        Args:
+            key (str): The key of the entry.
+
+        Returns:
+            The stored value or None if the key is not in the cache.
+        """
+        row = self.connection.execute("SELECT value FROM cells WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.pending_access[key] = time.time()
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """
+        Stores a value in the cache and evicts the least recently used entries if needed.
+
+        Args:
+            key (str): The key of the entry.
+            value: The value to store (it needs to be JSON serializable).
+
+        Returns:
+            None
+        """
+        data = json.dumps(value)
+        # The write lock is taken before reading the size of a replaced entry, so that other processes cannot change it
+        if not self.connection.in_transaction:
+            self.connection.execute("BEGIN IMMEDIATE")
+        row = self.connection.execute("SELECT size FROM cells WHERE key = ?", (key,)).fetchone()
+        self.connection.execute("INSERT OR REPLACE INTO cells (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                                (key, data, len(data), time.time()))
+        self.connection.execute("UPDATE metadata SET value = value + ? WHERE name = 'bytes'",
+                                (len(data) - (row[0] if row else 0),))
+        self.evict()
+        # The transaction is already open, so the pending accesses are written with it
+        self.flush()
+
+    def flush(self):
+        """
+        Writes the last access of the entries read since the last flush.
+
+        Returns:
+            None
+        """
+        if self.pending_access:
+            self.connection.executemany("UPDATE cells SET last_access = ? WHERE key = ?",
+                                        [(access, key) for key, access in self.pending_access.items()])
+            self.pending_access = {}
+        self.connection.commit()
+
+    def size(self):
+        """
+        Returns:
+            int: The size of the stored results, in bytes.
+        """
+        return self.connection.execute("SELECT value FROM metadata WHERE name = 'bytes'").fetchone()[0]
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the size of the cache is below max_bytes
+        (the entries are only scanned when the size is over the limit).
+
+        Returns:
+            None
+        """
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return
+
+        freed = 0
+        keys_to_remove = []
+        for key, size in self.connection.execute("SELECT key, size FROM cells ORDER BY last_access"):
+            keys_to_remove.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.connection.executemany("DELETE FROM cells WHERE key = ?", keys_to_remove)
+        self.connection.execute("UPDATE metadata SET value = value - ? WHERE name = 'bytes'", (freed,))
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of hits and misses and the size of the cache.
+        """
+        return {"hits": self.hits, "misses": self.misses, "bytes": self.size()}
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+def code_cache_key(cache, code, ipywidget_imported, function_name, code_options):
+    """
+    Builds the key of the cache for the result of code_to_cell.
+
+    Args:
+        cache (ConversionCache): The cache.
+        code (str): The code to be converted into code cells.
+        ipywidget_imported (bool): Indicates whether the `ipywidgets` library has already been imported.
+        function_name (str): The name of the function to be created.
+        code_options (dict): The rest of the options of code_to_cell.
+
+    Returns:
+        str: The key of the entry.
+    """
+    return cache.make_key('code', code, ipywidget_imported, function_name, sorted(code_options.items()))
+
+def get_code_cells(cache, key):
+    """
+    Gets a result of code_to_cell from the cache.
+
+    Args:
+        cache (ConversionCache): The cache.
+        key (str): The key of the entry (from code_cache_key).
+
+    Returns:
+        tuple: The list of code cells and the value of ipywidget_imported, or None if they are not in the cache.
+    """
+    value = cache.get(key)
+    if value is None:
+        return None
+    # The cells were validated when they were created, so they are not validated again
+    new_cells = [nbformat.from_dict({"id": random_cell_id(), "cell_type": "code", "metadata": cell["metadata"],
+                                     "execution_count": None, "source": cell["source"], "outputs": []})
+                 for cell in value["cells"]]
+    return new_cells, value["ipywidget_imported"]
+
+def put_code_cells(cache, key, new_cells, ipywidget_imported):
+    """
+    Stores a result of code_to_cell in the cache.
+
+    Args:
+        cache (ConversionCache): The cache.
+        key (str): The key of the entry (from code_cache_key).
+        new_cells (list): The code cells generated by code_to_cell.
+        ipywidget_imported (bool): The value of ipywidget_imported returned by code_to_cell.
+
+    Returns:
+        None
+    """
+    cache.put(key, {"cells": [{"source": cell.source, "metadata": cell.metadata} for cell in new_cells],
+                    "ipywidget_imported": ipywidget_imported})
+
+def cached_code_to_cell(cache, code, ipywidget_imported, function_name, **code_options):
+    """
+    Same as code_to_cell, but the result is taken from the cache if it was already computed.
+
+    Args:
+        cache (ConversionCache): The cache to use (if None, code_to_cell is directly called).
+        code (str): The code to be converted into code cells.
+        ipywidget_imported (bool): Indicates whether the `ipywidgets` library has already been imported.
+        function_name (str): The name of the function to be created.
+        **code_options: The rest of the options of code_to_cell (e.g. ast_globals).
+
+    Returns:
+        tuple: The list of code cells and the updated value of ipywidget_imported.
+    """
+    if cache is None:
+        return code_to_cell(code, ipywidget_imported, function_name, **code_options)
+
+    key = code_cache_key(cache, code, ipywidget_imported, function_name, code_options)
+    result = get_code_cells(cache, key)
+    if result is None:
+        result = code_to_cell(code, ipywidget_imported, function_name, **code_options)
+        put_code_cells(cache, key, *result)
+    return result
+
+def cached_markdown_to_cell(cache, text, section_localizer, cell_idx):
+    """
+    Same as markdown_to_cell, but the result is taken from the cache if it was already computed.
+    The sections found in the text are stored, so that they can be added to the section localizer
+    with the current cell index.
+
+    Args:
+        cache (ConversionCache): The cache to use (if None, markdown_to_cell is directly called).
+        text (str): The markdown text to be converted.
+        section_localizer (dict): A dictionary mapping section names to cell indices.
+        cell_idx (int): The index of the current cell.
+
+    Returns:
+        tuple: The converted text and the updated section localizer.
+    """
+    if cache is None:
+        return markdown_to_cell(text, section_localizer, cell_idx)
+
+    key = cache.make_key('markdown', text)
+    value = cache.get(key)
+    if value is None:
+        cell_sections = {}
+        new_text, cell_sections = markdown_to_cell(text, cell_sections, cell_idx)
+        cache.put(key, {"text": new_text, "sections": list(cell_sections)})
+        section_localizer.update(cell_sections)
+        return new_text, section_localizer
+
+    for section in value["sections"]:
+        section_localizer[section] = cell_idx
+    return value["text"], section_localizer
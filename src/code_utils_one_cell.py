@@ -1,6 +1,14 @@
 import re
+import os
+import ast
+import copy
+import hashlib
+from collections import namedtuple
+
 import nbformat
 
+from param_parser import param_marker, parse_param_line
+
 # Usefull regular expressions 
 installation_regex = r'(pip|conda) install'
 float_regex = r"[-+]?\d*\.\d+|[-+]?\d+"
@@ -13,24 +21,192 @@ function_regex = r"^\s*def\s+([a-zA-Z_]\w*)\s*\(.+\)\s*:\s*$"
 raw_regex = r"\{type:\"raw\"\}"
 comment_after_param_regex = r"(\[[^\]]*\]|\{[^}]*\})(?: [^#]*)?(\[[^\]]*\]|\{[^}]*\})* *#.*"
 
-def param_to_widget(code):
+# Imports added to the first cell with widgets
+ipywidget_import_code = ("import ipywidgets as widgets\n"
+                         "from IPython.display import display, clear_output\n")
+
+# Source of the cell with the helpers (a widget registry and the run_button decorator) used by
+# the cells with parameters with widget_runtime, added once before the first of them
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'widget_runtime.py')) as f:
+    widget_runtime_code = f.read().strip()
+
+# Compiled versions of the regular expressions used on every line
+# (the lines with @param are parsed with parse_param_line instead of param_regex and comment_after_param_regex)
+installation_pattern = re.compile(installation_regex)
+assignation_pattern = re.compile(assignation_regex)
+function_pattern = re.compile(function_regex)
+
+# Type of the params whose value is evaluated
+raw_param = '{type:"raw"}'
+
+# Kinds of lines found by classify_line
+LINE_INSTALL = 'install'
+LINE_PARAM = 'param'
+LINE_ASSIGNMENT = 'assignment'
+LINE_DEF = 'def'
+LINE_PLAIN = 'plain'
+
+# Result of classify_line: the kind of the line, the line itself and the relevant data
+# (the ParamInfo for params, the variable names for assignments and the function name for defs)
+LineInfo = namedtuple('LineInfo', ['kind', 'line', 'data'])
+
+def classify_line(line, find_names=True):
+    """
+    Classifies a line of code reading it only once, so that the rest of the conversion
+    does not need to run the regular expressions again.
+    Cheap substring checks are done before each regular expression, as most of the lines
+    do not contain the literals that the expressions need.
+    Parameters:
+        line (str): The line of code to classify.
+        find_names (bool): Whether to look for assignments and function definitions
+            (if False, those lines are classified as LINE_PLAIN).
+
+    Returns:
+        LineInfo: The kind of the line (LINE_INSTALL, LINE_PARAM, LINE_ASSIGNMENT, LINE_DEF or LINE_PLAIN),
+        the line and its data (the ParamInfo of the @param, the list of assigned variables or the function name).
+    """
+    if ' install' in line and installation_pattern.search(line):
+        return LineInfo(LINE_INSTALL, line, None)
+
+    if param_marker in line:
+        param_info = parse_param_line(line)
+        if param_info:
+            return LineInfo(LINE_PARAM, line, param_info)
+
+    if not find_names:
+        return LineInfo(LINE_PLAIN, line, None)
+
+    if '=' in line:
+        assign_match = assignation_pattern.match(line)
+        if assign_match:
+            return LineInfo(LINE_ASSIGNMENT, line, assign_match.group(1).split(','))
+
+    if 'def' in line:
+        function_match = function_pattern.match(line)
+        if function_match:
+            return LineInfo(LINE_DEF, line, function_match.group(1))
+
+    return LineInfo(LINE_PLAIN, line, None)
+
+def _target_names(target):
+    """
+    Yields the names bound by the target of an assignment, a for loop or a with statement
+    (e.g. a, b and c for (a, [b, *c])). Attributes and subscripts do not bind names.
+    """
+    if isinstance(target, ast.Name):
+        yield target.id
+    elif isinstance(target, (ast.Tuple, ast.List)):
+        for element in target.elts:
+            yield from _target_names(element)
+    elif isinstance(target, ast.Starred):
+        yield from _target_names(target.value)
+
+def _bound_names(statements, find_walrus=True):
+    """
+    Yields the names bound at the top level by a list of statements, with a flag that is True for
+    functions and classes, False for variables and None for annotated variables. The bodies of compound
+    statements (if, for, while, with, try) are also top level, but not the bodies of functions and classes.
+    """
+    for statement in statements:
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            yield statement.name, True
+            continue
+        if isinstance(statement, ast.Assign):
+            for target in statement.targets:
+                for name in _target_names(target):
+                    yield name, False
+        elif isinstance(statement, ast.AugAssign):
+            for name in _target_names(statement.target):
+                yield name, False
+        elif isinstance(statement, ast.AnnAssign) and statement.value is not None:
+            # Python does not allow to declare as global an annotated name (SyntaxError),
+            # so they are yielded as annotated to be left out of the global declarations
+            for name in _target_names(statement.target):
+                yield name, None
+        elif isinstance(statement, (ast.For, ast.AsyncFor)):
+            for name in _target_names(statement.target):
+                yield name, False
+        elif isinstance(statement, (ast.With, ast.AsyncWith)):
+            for item in statement.items:
+                if item.optional_vars is not None:
+                    for name in _target_names(item.optional_vars):
+                        yield name, False
+        elif isinstance(statement, (ast.Import, ast.ImportFrom)):
+            for alias in statement.names:
+                if alias.name != '*':
+                    yield alias.asname or alias.name.split('.')[0], False
+
+        # Names bound with := in the expressions of the statement
+        if find_walrus:
+            for child in ast.iter_child_nodes(statement):
+                if isinstance(child, ast.expr):
+                    for node in ast.walk(child):
+                        if isinstance(node, ast.NamedExpr):
+                            yield from ((name, False) for name in _target_names(node.target))
+
+        # The bodies of the compound statements
+        for field in ('body', 'orelse', 'finalbody'):
+            yield from _bound_names(getattr(statement, field, []), find_walrus)
+        for handler in getattr(statement, 'handlers', []):
+            yield from _bound_names(handler.body, find_walrus)
+
+def find_global_names(code):
+    """
+    Finds the names bound at the top level of the code (assignments, augmented assignments, for and with targets,
+    imports, functions and classes) parsing it with ast. Annotated assignments are left out, as Python does not
+    allow to declare their names as global. The lines with IPython syntax (! and %) are ignored.
+    Parameters:
+        code (str): The code to analyze.
+
+    Returns:
+        tuple: The list of variable names and the list of function and class names (without duplicates
+        and in order of appearance), or None if the code cannot be parsed.
+    """
+    # The shell commands and magics are not Python, so they are replaced by pass statements
+    lines = []
+    for line in code.split('\n'):
+        stripped = line.lstrip()
+        if stripped.startswith(('!', '%')):
+            line = line[:len(line) - len(stripped)] + 'pass'
+        lines.append(line)
+
+    try:
+        tree = ast.parse('\n'.join(lines))
+    except (SyntaxError, ValueError):
+        return None
+
+    var_list = []
+    func_list = []
+    seen = set()
+    annotated = set()
+    # Walking all the expressions is only needed if there is any :=
+    for name, is_function in _bound_names(tree.body, find_walrus=':=' in code):
+        if is_function is None:
+            annotated.add(name)
+        elif name not in seen:
+            seen.add(name)
+            (func_list if is_function else var_list).append(name)
+    return [var for var in var_list if var not in annotated], func_list
+
+def param_to_widget(code, param_info=None):
     """
     Extracts components from a line with @param and creates ipywidgets based on the extracted information.
     Parameters:
         code (str): The line of code containing the @param component.
+        param_info (ParamInfo): The result of parse_param_line on the line, if it has already been computed.
 
     Returns:
         str: The generated widget code.
         str: The name of the variable associated with the widget.
     """
 
-    # Extract the components from a line with @param component
-    match_param = re.search(param_regex, code)
-    var_name = match_param.group(1)
-    default_value = match_param.group(2)
-    post_param = match_param.group(3)
+    # Extract the components from a line with @param component (reading it only once)
+    if param_info is None:
+        param_info = parse_param_line(code)
+    var_name = param_info.var_name
+    default_value = param_info.default_value
     
-    if re.match(comment_after_param_regex, post_param):
+    if param_info.comment_after:
         # In case is the strange scenario with comment after @param 
         # And after it will be treated as raw parameter
 
@@ -39,16 +215,14 @@ def param_to_widget(code):
         else:
             result = f'widget_{var_name} = widgets.Text(value="{default_value}", style={ipywidget_style}, description="{var_name}:")\n'
     else:
-        # Extract the type of the @param
-        match_type = re.findall(r"{type:\s*\"(\w+)\".*}", post_param)
-        param_type = match_type[0] if match_type else None
+        # The type of the @param
+        param_type = param_info.param_type
 
-        # Extract and check if instead of a type, a list is defined 
-        match_list = re.findall(r"(\[.*?\])", post_param)
-        if match_list:
-            possible_values = match_list[0]
+        # Check if instead of a type, a list is defined 
+        if param_info.options is not None:
+            possible_values = param_info.options
 
-            if re.findall(r"{allow-input:\s*true}", post_param):
+            if param_info.allow_input:
                 # In case the variable allow-input is found, a Combobox ipywidget is added (allowing new inputs)
                 result = f'widget_{var_name} = widgets.Combobox(options={possible_values}, placeholder={default_value}, style={ipywidget_style}, description="{var_name}:")\n'
             else:
@@ -76,7 +250,9 @@ def param_to_widget(code):
         elif param_type is not None:
             # If it is not a list a list of values, it would be one of the following types (adding ipywidgets based on the type)
             if param_type == "slider":
-                min, max, step = re.findall(f"\s*min:({float_regex}),\s*max:({float_regex}),\s*step:({float_regex})", post_param)[0]
+                if param_info.slider is None:
+                    raise ValueError(f"The slider has no min, max and step: {param_info.post_param}")
+                min, max, step = param_info.slider
                 try:
                     min, max, step = int(min), int(max), int(step)
                     result = f'widget_{var_name} = widgets.IntSlider(value={default_value}, min={min}, max={max}, step={step}, style={ipywidget_style}, description="{var_name}:")\n'
@@ -171,19 +347,45 @@ def count_spaces(sentence):
     else:
         return 0
 
-def code_to_cell(code, ipywidget_imported, function_name):
+def new_hidden_code_cell(source):
+    """
+    Creates a code cell with its content hidden (only the title and the output are shown).
+    Parameters:
+    - source (str): The code of the cell.
+    Returns:
+    - cell (NotebookNode): The code cell.
+    """
+    cell = nbformat.v4.new_code_cell(source)
+    cell.metadata["cellView"] = "form"
+    cell.metadata["collapsed"] = True
+    cell.metadata["jupyter"] = {"source_hidden": True}
+    return cell
+
+def code_to_cell(code, ipywidget_imported, function_name, ast_globals=False, widget_runtime=False, memoize=0):
     """
     Generates a list of code cells for a Jupyter notebook based on the given code.
     Parameters:
     - code (str): The code to be converted into code cells.
     - ipywidget_imported (bool): Indicates whether the `ipywidgets` library has already been imported.
     - function_name (str): The name of the function to be created.
+    - ast_globals (bool): Whether to find the names that need to be global parsing the cell with `ast`
+      (falling back to the regular expressions if it cannot be parsed) instead of using regular expressions on each line.
+    - widget_runtime (bool): Whether the cells with parameters use the helpers of widget_runtime.py (added as a cell
+      before the first of them, instead of the ipywidgets import) instead of defining their own button and output.
+      The function gets a suffix with the hash of the code, so that the functions of different cells do not collide
+      (cells with the same code need different function names, see transform.function_name).
+    - memoize (int): The number of runs of each cell with parameters that are saved by the values of its widgets, so that
+      clicking the button with the same values restores its global variables and output instead of running it again
+      (0 to always run it). It needs widget_runtime, where the runs are saved.
     Returns:
     - new_cells (list): A list of code cells generated from the given code.
-    - ipywidget_imported (bool): An updated value indicating whether the `ipywidgets` library has been imported.
+    - ipywidget_imported (bool): An updated value indicating whether the `ipywidgets` library (or the runtime) has been imported.
     """
  
 
+    if memoize and not widget_runtime:
+        raise ValueError("memoize needs widget_runtime")
+
     # Future lines of code that are based on widgets or not
     widget_code = ''
     non_widget_code = ''
@@ -196,38 +398,51 @@ def code_to_cell(code, ipywidget_imported, function_name):
     # We are going line by line analyzing them
     lines = code.split('\n')  
     for line in lines:
-        if re.search(installation_regex, line):
+        line_info = classify_line(line, find_names=not ast_globals)
+        if line_info.kind == LINE_INSTALL:
             # The installation lines are removed
             pass
-        elif re.search(param_regex, line):
+        elif line_info.kind == LINE_PARAM:
             # The lines with #@param are replaced with ipywidgets based on the parameters
-            new_line, var_name = param_to_widget(line)
+            param_info = line_info.data
+            new_line, var_name = param_to_widget(line, param_info)
             if var_name != "" and var_name not in widget_var_list:
                 widget_var_list.append(var_name)
             widget_code += new_line + '\n'
 
-            if re.search(raw_regex, line) or re.match(comment_after_param_regex, re.search(param_regex, line).group(3)):
+            if raw_param in line or param_info.comment_after:
                 # In case the param is raw or it has a comment after @param, the value of the widget needs to evaluated
                 non_widget_code += ' ' * count_spaces(line) + f"{var_name} = eval(widget_{var_name}.value)\n"
             else:
                 non_widget_code += ' '*count_spaces(line) + f"{var_name} = widget_{var_name}.value\n"
         else:
             # In the other the variable and function names are extracted
-            assign_match = re.match(assignation_regex, line)
-            if assign_match:
-                possible_variables = assign_match.group(1).split(',')
-                for var in possible_variables:
+            if line_info.kind == LINE_ASSIGNMENT:
+                for var in line_info.data:
                     var_list.append(var)
-            
-            function_match = re.match(function_regex, line)
-            if function_match:
-                func_list.append(function_match.group(1))
+            elif line_info.kind == LINE_DEF:
+                func_list.append(line_info.data)
 
             # And the line is added as it is
             non_widget_code += line + '\n'
 
     new_cells = []
 
+    if ast_globals and widget_var_list:
+        # The names are only needed when the code is encapsulated in a function
+        global_names = find_global_names(non_widget_code)
+        if global_names is None:
+            # Colab only syntax that ast cannot parse, so the regular expressions are used
+            for line in lines:
+                line_info = classify_line(line)
+                if line_info.kind == LINE_ASSIGNMENT:
+                    var_list.extend(line_info.data)
+                elif line_info.kind == LINE_DEF:
+                    func_list.append(line_info.data)
+        else:
+            var_list, func_list = global_names
+            var_list = [var for var in var_list if var not in widget_var_list]
+
     if widget_var_list:
         # In case a param was found, everything will be encapsulated in a function
 
@@ -245,37 +460,88 @@ def code_to_cell(code, ipywidget_imported, function_name):
 
         # All the new lines of code are ensambled
         code_cell = "# Run this cell to visualize the parameters and click the button to execute the code\n"
-        if not ipywidget_imported:
-            # In case the ipywidgets library have not been imported yet
-            code_cell += ("import ipywidgets as widgets\n" 
-                          "from IPython.display import display, clear_output\n")       
-            ipywidget_imported = True
-
-        code_cell += ("clear_output()\n\n" # In orther to renew the ipywidgets
-                    ) + widget_code + ( # Add the code with the widgets at the begining of the cell
-                    f"\ndef {function_name}(output_widget):\n" # The function that will be called whwn clicking the button
-                    "  output_widget.clear_output()\n" # Clear the output that was displayed when calling the function
-                    "  with output_widget:\n" # In order to display the output
-                    ) + global_variables + '\n' + tabbed_non_widget_code + ( # Add the global variables and the non widget code
-                    "    plt.show()\n" # Add plt.show() in case there is any plot in tab_non_widget_code, so that it can be displayed
-                    "button = widgets.Button(description='Load and run')\n" # Add the button that calls the function
-                    "output = widgets.Output()\n"
-                    "display(button, output)\n\n"
-                    f"def aux_{function_name}(_):\n" 
-                    f"  return {function_name}(output)\n\n"
-                    f"button.on_click(aux_{function_name})\n"
-                    )
+        if widget_runtime:
+            if not ipywidget_imported:
+                # The runtime is added in its own cell, before the first cell with parameters
+                new_cells.append(new_hidden_code_cell(widget_runtime_code))
+                ipywidget_imported = True
+
+            run_button_args = [f"widget_{var}" for var in widget_var_list]
+            if memoize:
+                # The global variables are the ones restored from a saved run (the names of tuple
+                # assignments found by the regular expressions keep the spaces after the commas)
+                saved_names = list(dict.fromkeys(name.strip() for name in widget_var_list + var_list + func_list))
+                run_button_args += [f"memoize={memoize}", f"global_names={saved_names}"]
+            code_cell += ("clear_output()\n\n" # In orther to renew the ipywidgets
+                        ) + widget_code + ( # Add the code with the widgets at the begining of the cell
+                        "\n@run_button(" + ", ".join(run_button_args) + ")\n" # Registers the widgets and displays the button
+                        f"def {function_name}_{hashlib.sha1(code.encode()).hexdigest()[:8]}():\n"
+                        ) + global_variables + '\n' + tabbed_non_widget_code
+        else:
+            if not ipywidget_imported:
+                # In case the ipywidgets library have not been imported yet
+                code_cell += ipywidget_import_code
+                ipywidget_imported = True
+
+            code_cell += ("clear_output()\n\n" # In orther to renew the ipywidgets
+                        ) + widget_code + ( # Add the code with the widgets at the begining of the cell
+                        f"\ndef {function_name}(output_widget):\n" # The function that will be called whwn clicking the button
+                        "  output_widget.clear_output()\n" # Clear the output that was displayed when calling the function
+                        "  with output_widget:\n" # In order to display the output
+                        ) + global_variables + '\n' + tabbed_non_widget_code + ( # Add the global variables and the non widget code
+                        "    plt.show()\n" # Add plt.show() in case there is any plot in tab_non_widget_code, so that it can be displayed
+                        "button = widgets.Button(description='Load and run')\n" # Add the button that calls the function
+                        "output = widgets.Output()\n"
+                        "display(button, output)\n\n"
+                        f"def aux_{function_name}(_):\n" 
+                        f"  return {function_name}(output)\n\n"
+                        f"button.on_click(aux_{function_name})\n"
+                        )
     else:
         # Otherwise, just add the code
         code_cell = "# Run this cell to execute the code\n" +  non_widget_code
 
-    #Create the code cell
-    aux_cell = nbformat.v4.new_code_cell(clear_excesive_empty_lines(code_cell))
-    # Hides the content in the code cells
-    aux_cell.metadata["cellView"] = "form"
-    aux_cell.metadata["collapsed"] = True
-    aux_cell.metadata["jupyter"] = {"source_hidden": True}
-            
-    new_cells.append(aux_cell)
+    #Create the code cell, hiding its content
+    new_cells.append(new_hidden_code_cell(clear_excesive_empty_lines(code_cell)))
     
     return new_cells, ipywidget_imported
+
+def remove_ipywidget_import(new_cells):
+    """
+    Removes the import of the ipywidgets library (or the cell with the widget runtime) from cells generated by
+    code_to_cell with ipywidget_imported=False, so that they are the same as if they had been generated with ipywidget_imported=True.
+    Parameters:
+    - new_cells (list): The code cells generated by code_to_cell.
+    Returns:
+    - new_cells (list): The same code cells, without the import.
+    """
+    new_cells = [cell for cell in new_cells if cell.source != widget_runtime_code]
+    for cell in new_cells:
+        # The import is always right after the first comment line of the cell
+        cell.source = cell.source.replace(ipywidget_import_code, '', 1)
+    return new_cells
+
+def add_ipywidget_import(new_cells):
+    """
+    Adds the import of the ipywidgets library (or the cell with the widget runtime) to the first cell with widgets
+    when they do not have it, e.g. when a part of the notebook without its first cell with widgets is taken out.
+    Parameters:
+    - new_cells (list): The code cells generated by code_to_cell.
+    Returns:
+    - new_cells (list): The cells with the import (the changed cell is a copy, the given ones are not modified).
+    """
+    for i, cell in enumerate(new_cells):
+        if cell.cell_type != "code":
+            continue
+        if cell.source == widget_runtime_code or ipywidget_import_code in cell.source:
+            # Already imported
+            return new_cells
+        if '@run_button(' in cell.source:
+            return new_cells[:i] + [new_hidden_code_cell(widget_runtime_code)] + new_cells[i:]
+        if 'display(widget_' in cell.source:
+            # The import goes right after the first comment line of the cell
+            new_cell = copy.deepcopy(cell)
+            first_line, rest = new_cell.source.split('\n', 1)
+            new_cell.source = first_line + '\n' + ipywidget_import_code + rest
+            return new_cells[:i] + [new_cell] + new_cells[i + 1:]
+    return new_cells
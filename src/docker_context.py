@@ -0,0 +1,236 @@
+import os
+import re
+import shlex
+from collections import namedtuple
+
+from code_utils_one_cell import classify_line, LINE_INSTALL
+
+# The installation command inside a line (e.g. !pip install, %pip install, !python -m pip install or !conda install)
+install_command_regex = r'(?:^|[\s!%;&|(])(?:python3?\s+-m\s+)?(pip3?|conda|mamba)\s+install\b'
+install_command_pattern = re.compile(install_command_regex)
+
+# Options of pip that are kept in the requirements files and options (of pip and conda) that take a value
+pip_requirement_options = {'-i': '--index-url', '--index-url': '--index-url',
+                           '--extra-index-url': '--extra-index-url', '-f': '--find-links', '--find-links': '--find-links'}
+options_with_value = {'-c', '--channel', '-i', '--index-url', '--extra-index-url', '-f', '--find-links', '-r',
+                      '--requirement', '-e', '--editable', '--target', '-t', '--prefix', '--root', '-n', '--name',
+                      '-p', '--platform', '--python-version', '--constraint'}
+
+# Packages needed to run the transformed notebooks, installed in the first layer
+base_packages = ['notebook', 'ipywidgets']
+
+# Installation command parsed by parse_install_line: the package manager ('pip' or 'conda'),
+# the packages, the options kept in the environment files (pip indexes or conda channels) and what could not be parsed
+InstallCommand = namedtuple('InstallCommand', ['manager', 'packages', 'options', 'unresolved'])
+
+def parse_install_line(line):
+    """
+    Parses a line with pip or conda install (e.g. !pip install -q numpy==1.24 "scikit-image>=0.19").
+
+    Args:
+        line (str): The line of code.
+
+    Returns:
+        list: An InstallCommand per installation command of the line (there can be several joined with && or ;).
+    """
+    commands = []
+    for match in install_command_pattern.finditer(line):
+        manager = 'conda' if match.group(1) in ('conda', 'mamba') else 'pip'
+        rest = line[match.end():]
+        try:
+            lexer = shlex.shlex(rest, posix=True, punctuation_chars=';&|')
+            lexer.whitespace_split = True
+            lexer.commenters = '#'
+            tokens = list(lexer)
+        except ValueError:
+            commands.append(InstallCommand(manager, [], [], [rest.strip()]))
+            continue
+
+        packages, options, unresolved = [], [], []
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token and set(token) <= set(';&|'):
+                # End of the command
+                break
+            value = None
+            if token.startswith('-'):
+                name, _, inline_value = token.partition('=')
+                if name in options_with_value:
+                    value = inline_value or (tokens[i + 1] if i + 1 < len(tokens) else None)
+                    i += 1 if inline_value else 2
+                else:
+                    # Options that do not change what is installed (-q, -y, -U, --no-deps...)
+                    i += 1
+                if name in ('-c', '--channel') and manager == 'conda' and value:
+                    options.append(value)
+                elif name in pip_requirement_options and manager == 'pip' and value:
+                    options.append(f'{pip_requirement_options[name]} {value}')
+                elif name in ('-r', '--requirement', '-e', '--editable'):
+                    # Files and local paths are not in the build context
+                    unresolved.append(f'{name} {value}')
+                continue
+            i += 1
+            if '$' in token or '{' in token:
+                # Shell or Python variables
+                unresolved.append(token)
+            else:
+                packages.append(token)
+        commands.append(InstallCommand(manager, packages, options, unresolved))
+    return commands
+
+def find_install_commands(code):
+    """
+    Finds the installation commands of a code cell (the lines that code_to_cell removes).
+
+    Args:
+        code (str): The code of the cell.
+
+    Returns:
+        list: The InstallCommand of each installation command.
+    """
+    commands = []
+    for line in code.split('\n'):
+        if line.lstrip().startswith('#') or classify_line(line, find_names=False).kind != LINE_INSTALL:
+            continue
+        line_commands = parse_install_line(line)
+        if not line_commands:
+            # Not a shell command (e.g. inside a string in Python code), it is reported to be checked by hand
+            manager = 'conda' if 'conda install' in line else 'pip'
+            line_commands = [InstallCommand(manager, [], [], [line.strip()])]
+        commands.extend(line_commands)
+    return commands
+
+def package_name(requirement, manager='pip'):
+    """
+    Extracts the normalized name of the package of a requirement, so that the same package written in
+    different ways is only installed once (e.g. Scikit_Image>=0.19 and scikit-image are both scikit-image).
+
+    Args:
+        requirement (str): The requirement (e.g. numpy==1.24 or tensorflow[and-cuda]).
+        manager (str): The package manager ('pip' or 'conda').
+
+    Returns:
+        str: The normalized name.
+    """
+    if '://' in requirement or requirement.startswith(('git+', '.', '/')):
+        # URLs and paths are only deduplicated if they are identical
+        return requirement
+    name = re.split(r'[\s\[<>=!~;@]' if manager == 'pip' else r'[\s<>=!~]', requirement, maxsplit=1)[0]
+    if manager == 'conda' and '::' in name:
+        name = name.split('::', 1)[1]
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+def has_version(requirement):
+    """
+    Args:
+        requirement (str): The requirement (e.g. numpy==1.24).
+
+    Returns:
+        bool: Whether the requirement restricts the version, extras or source of the package.
+    """
+    return re.search(r'[<>=!~@\[]', requirement) is not None
+
+def merge_dependencies(notebook_commands):
+    """
+    Deduplicates the packages of a batch of notebooks and splits them into the ones shared by several
+    notebooks and the ones that only one notebook needs.
+
+    Args:
+        notebook_commands (dict): The list of InstallCommand of each notebook (by its path).
+
+    Returns:
+        dict: For each package manager ('pip' and 'conda'), the sorted 'shared' and 'notebook' requirements
+        and 'options'; plus the 'conflicts' (packages requested with different versions) and the 'unresolved' parts.
+    """
+    # The requirements of each package and the notebooks that need it
+    packages = {'pip': {}, 'conda': {}}
+    options = {'pip': set(), 'conda': set()}
+    unresolved = set()
+    for notebook, commands in notebook_commands.items():
+        for command in commands:
+            options[command.manager].update(command.options)
+            unresolved.update(command.unresolved)
+            for requirement in command.packages:
+                entry = packages[command.manager].setdefault(package_name(requirement, command.manager),
+                                                             {"requirements": {}, "notebooks": set()})
+                entry["requirements"].setdefault(requirement, set()).add(notebook)
+                entry["notebooks"].add(notebook)
+
+    dependencies = {"conflicts": [], "unresolved": sorted(unresolved)}
+    for manager, manager_packages in packages.items():
+        shared, notebook_only = [], []
+        for name, entry in sorted(manager_packages.items()):
+            requirements = entry["requirements"]
+            # The requirement with a version is preferred, then the one requested by more notebooks
+            requirement = min(requirements, key=lambda r: (not has_version(r), -len(requirements[r]), r))
+            if len([r for r in requirements if has_version(r)]) > 1:
+                dependencies["conflicts"].append({"package": name, "requirements": sorted(requirements),
+                                                  "selected": requirement})
+            (shared if len(entry["notebooks"]) > 1 else notebook_only).append(requirement)
+        dependencies[manager] = {"shared": shared, "notebook": notebook_only, "options": sorted(options[manager])}
+    return dependencies
+
+def _write_if_changed(path, content):
+    # Files with the same content are not rewritten, so their modification time does not change
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == content:
+                return
+    with open(path, 'w') as f:
+        f.write(content)
+
+def _requirements_file(options, requirements):
+    return ''.join(f'{line}\n' for line in options + requirements)
+
+def _environment_file(channels, requirements):
+    content = 'channels:\n' + ''.join(f'  - {channel}\n' for channel in channels) if channels else ''
+    return content + 'dependencies:\n' + ''.join(f'  - {requirement}\n' for requirement in requirements)
+
+def write_docker_context(dependencies, context_dir, base_image=None):
+    """
+    Writes a Dockerfile with the dependencies split into layers from the most to the least shared:
+    the packages needed to run the notebooks, the packages shared by several notebooks and the packages of a
+    single notebook (in requirements-*.txt for pip and environment-*.yml for conda). Adding a notebook usually
+    only changes the last layers, so the rest are reused from the Docker cache.
+
+    Args:
+        dependencies (dict): The dependencies returned by merge_dependencies.
+        context_dir (str): The directory where the files are written.
+        base_image (str): The base image (by default, a Python image, or a Miniconda one if conda is needed).
+
+    Returns:
+        list: The paths of the written files.
+    """
+    os.makedirs(context_dir, exist_ok=True)
+    pip, conda = dependencies["pip"], dependencies["conda"]
+    needs_conda = bool(conda["shared"] or conda["notebook"])
+    if base_image is None:
+        base_image = 'continuumio/miniconda3' if needs_conda else 'python:3.10-slim'
+
+    dockerfile = [f'FROM {base_image}', '',
+                  '# Packages needed to run the transformed notebooks',
+                  f'RUN pip install --no-cache-dir {" ".join(base_packages)}']
+    files = {}
+    for layer in ('shared', 'notebook'):
+        description = 'shared by several notebooks' if layer == 'shared' else 'needed by a single notebook'
+        if conda[layer]:
+            name = f'environment-{layer}.yml'
+            files[name] = _environment_file(conda["options"], conda[layer])
+            dockerfile += ['', f'# Conda packages {description}', f'COPY {name} /tmp/{name}',
+                           f'RUN conda env update -n base -f /tmp/{name} && conda clean -afy']
+        if pip[layer]:
+            name = f'requirements-{layer}.txt'
+            files[name] = _requirements_file(pip["options"], pip[layer])
+            dockerfile += ['', f'# Pip packages {description}', f'COPY {name} /tmp/{name}',
+                           f'RUN pip install --no-cache-dir -r /tmp/{name}']
+    dockerfile += ['', 'WORKDIR /notebooks',
+                   'CMD ["jupyter", "notebook", "--ip=0.0.0.0", "--no-browser", "--allow-root"]']
+    files['Dockerfile'] = '\n'.join(dockerfile) + '\n'
+
+    paths = []
+    for name, content in files.items():
+        path = os.path.join(context_dir, name)
+        _write_if_changed(path, content)
+        paths.append(path)
+    return paths
@@ -0,0 +1,65 @@
+import os
+import json
+import random
+
+import nbformat
+
+from stream_reader import is_binary_file
+
+# orjson is optional: it is used when it is installed, otherwise the json library is used
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps_notebook(nb, compact=False):
+    """
+    Serializes a notebook generated by the transformation directly as JSON. Unlike nbformat.writes,
+    the notebook is not copied, the sources are kept as strings (instead of lists of lines) and
+    it is not validated, so it should only be used with notebooks built with the nbformat.v4.new_* functions.
+
+    Args:
+        nb (NotebookNode): The notebook to serialize.
+        compact (bool): Whether to write the JSON without indentation.
+
+    Returns:
+        bytes: The serialized notebook (UTF-8), ending with a new line.
+    """
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE
+        if not compact:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(nb, option=option)
+
+    # The same format as orjson (which only indents with 2 spaces), so the result does not depend on whether it is installed
+    if compact:
+        data = json.dumps(nb, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    else:
+        data = json.dumps(nb, sort_keys=True, ensure_ascii=False, indent=2)
+    return (data + '\n').encode('utf-8')
+
+def fast_write_notebook(new_nb, destination, compact=False, validate_ratio=0.0):
+    """
+    Writes a notebook to a path or file-like object skipping (or sampling) the schema validation.
+
+    Args:
+        new_nb (NotebookNode): The notebook to write.
+        destination (str or file-like): Path of the notebook file or file-like object (text or binary).
+        compact (bool): Whether to write the JSON without indentation.
+        validate_ratio (float): Probability of validating the notebook against the schema before writing it
+            (0 never validates and 1 always validates).
+
+    Returns:
+        None
+    """
+    if validate_ratio and random.random() < validate_ratio:
+        nbformat.validate(new_nb)
+
+    data = dumps_notebook(new_nb, compact=compact)
+    if isinstance(destination, (str, os.PathLike)):
+        with open(destination, 'wb') as f:
+            f.write(data)
+    elif is_binary_file(destination):
+        destination.write(data)
+    else:
+        destination.write(data.decode('utf-8'))
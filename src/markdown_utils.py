@@ -1,8 +1,21 @@
 import re 
+import os
+import base64
+import binascii
+import hashlib
+import mimetypes
+import tempfile
 
 # Usefull regular expressions 
 heading_regex = r'^(#+)(.*)$'
 section_regex = r'^#+\s*\**([\d.]+)'
+# The base64 of a data URI can be wrapped in several lines (each one ends the line or the URI)
+data_uri_regex = r'data:(image/[\w.+-]+);base64,([A-Za-z0-9+/]+(?:[ \t]*\r?\n[ \t]*[A-Za-z0-9+/]+(?=[ \t]*\r?\n|[=)"\'>]|$))*=*)(?![A-Za-z0-9+/=])'
+attachment_regex = r'attachment:([^\s)"\'>]+)'
+
+# Extensions of the most common image types (the rest are guessed with mimetypes)
+image_extensions = {'image/png': '.png', 'image/jpeg': '.jpg', 'image/gif': '.gif',
+                    'image/svg+xml': '.svg', 'image/webp': '.webp'}
 
 def markdown_to_cell(text, section_localizer, cell_idx):
     """
@@ -25,4 +38,77 @@ def markdown_to_cell(text, section_localizer, cell_idx):
             if section_match:
                 section_localizer[section_match.group(1)] = cell_idx
         new_text += line + '\n'
-    return new_text, section_localizer
\ No newline at end of file
+    return new_text, section_localizer
+
+def save_asset(data, mime, assets_dir):
+    """
+    Saves an image in the assets directory, named by the hash of its content, so that the same image
+    is only stored once (even if it appears in different notebooks).
+
+    Args:
+        data (bytes): The content of the image.
+        mime (str): The MIME type of the image (e.g. image/png).
+        assets_dir (str): The directory where the assets are saved.
+
+    Returns:
+        str: The name of the file of the image.
+    """
+    extension = image_extensions.get(mime) or mimetypes.guess_extension(mime) or ''
+    name = hashlib.sha256(data).hexdigest()[:32] + extension
+    path = os.path.join(assets_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(assets_dir, exist_ok=True)
+        # Written to a temporary file and then renamed, so that other processes never see it half written
+        fd, temporary_path = tempfile.mkstemp(dir=assets_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temporary_path, path)
+    return name
+
+def externalize_assets(text, attachments, assets_dir, assets_prefix=None):
+    """
+    Saves the attachments of a markdown cell and the images embedded as data URIs in its text
+    in the assets directory, and rewrites their references to point to the saved files.
+
+    Args:
+        text (str): The markdown text.
+        attachments (dict): The attachments of the cell (name to MIME bundle), or None.
+        assets_dir (str): The directory where the assets are saved.
+        assets_prefix (str): The path used in the references to the assets (by default, assets_dir).
+
+    Returns:
+        str: The markdown text with the rewritten references.
+    """
+    prefix = (assets_dir if assets_prefix is None else assets_prefix).replace(os.sep, '/').rstrip('/')
+
+    def asset_path(name):
+        return f'{prefix}/{name}' if prefix else name
+
+    # Images embedded as data URIs
+    def replace_data_uri(match):
+        try:
+            data = base64.b64decode(re.sub(r'\s', '', match.group(2)), validate=True)
+        except binascii.Error:
+            # Not valid base64, the URI is left as it is
+            return match.group(0)
+        return asset_path(save_asset(data, match.group(1), assets_dir))
+    if 'data:image/' in text:
+        text = re.sub(data_uri_regex, replace_data_uri, text)
+
+    # Attachments of the cell
+    if attachments:
+        saved = {}
+        for name, bundle in attachments.items():
+            for mime, data in bundle.items():
+                if isinstance(data, list):
+                    data = ''.join(data)
+                # SVG images are stored as text and the rest as base64
+                content = data.encode('utf-8') if mime == 'image/svg+xml' else base64.b64decode(data)
+                saved[name] = asset_path(save_asset(content, mime, assets_dir))
+                break
+
+        def replace_attachment(match):
+            return saved.get(match.group(1), match.group(0))
+        text = re.sub(attachment_regex, replace_attachment, text)
+
+    return text
@@ -0,0 +1,214 @@
+from collections import namedtuple
+
+# Marker of the Colab form parameters
+param_marker = '#@param'
+
+# Result of parse_param_line: the parts of the line (the same as the groups of param_regex)
+# and the options found after #@param (the same as the regular expressions used by param_to_widget)
+ParamInfo = namedtuple('ParamInfo', ['var_name', 'default_value', 'post_param',
+                                     'comment_after', 'param_type', 'options', 'allow_input', 'slider'])
+
+def _is_word(char):
+    # Same characters as \w
+    return char.isalnum() or char == '_'
+
+def _skip_spaces(text, i):
+    while i < len(text) and text[i].isspace():
+        i += 1
+    return i
+
+def _find_post_param(line, start):
+    """
+    Finds the text after #@param, skipping the spaces before it (the same as \\s*(.+) in param_regex).
+
+    Args:
+        line (str): The line of code.
+        start (int): The position right after #@param.
+
+    Returns:
+        str: The text after #@param or None if there is nothing after it.
+    """
+    i = _skip_spaces(line, start)
+    if i < len(line):
+        end = line.find('\n', i)
+        return line[i:end if end != -1 else len(line)]
+    # Only spaces after #@param: the last one that is not a new line
+    for i in range(len(line) - 1, start - 1, -1):
+        if line[i] != '\n':
+            return line[i]
+    return None
+
+def _match_group(text, i):
+    """
+    Args:
+        text (str): The text.
+        i (int): A position of the text.
+
+    Returns:
+        int: The position after the [...] or {...} group that starts at i, or -1 if there is none.
+    """
+    if i >= len(text) or text[i] not in '[{':
+        return -1
+    end = text.find(']' if text[i] == '[' else '}', i + 1)
+    return end + 1 if end != -1 else -1
+
+def _has_comment_after(post_param):
+    """
+    Checks whether there is a comment after the options of the @param (the same as comment_after_param_regex).
+    """
+    i = _match_group(post_param, 0)
+    if i == -1 or '#' not in post_param[i:]:
+        return False
+    if post_param[i] == ' ':
+        # Anything can be between the options and the comment
+        return True
+    # Only more groups of options and spaces
+    while True:
+        end = _match_group(post_param, i)
+        if end == -1:
+            break
+        i = end
+    while i < len(post_param) and post_param[i] == ' ':
+        i += 1
+    return i < len(post_param) and post_param[i] == '#'
+
+def _find_type(post_param):
+    """
+    Finds the type of the @param, e.g. string for {type:"string"} (the same as the first match of {type:\\s*"(\\w+)".*}).
+    """
+    last_brace = post_param.rfind('}')
+    i = post_param.find('{type:')
+    while i != -1:
+        start = _skip_spaces(post_param, i + len('{type:'))
+        if start < len(post_param) and post_param[start] == '"':
+            end = start + 1
+            while end < len(post_param) and _is_word(post_param[end]):
+                end += 1
+            if end > start + 1 and end < len(post_param) and post_param[end] == '"' and last_brace > end:
+                return post_param[start + 1:end]
+        i = post_param.find('{type:', i + 1)
+    return None
+
+def _find_allow_input(post_param):
+    """
+    Checks whether the @param allows new values (the same as a match of {allow-input:\\s*true}).
+    """
+    i = post_param.find('{allow-input:')
+    while i != -1:
+        start = _skip_spaces(post_param, i + len('{allow-input:'))
+        if post_param.startswith('true}', start):
+            return True
+        i = post_param.find('{allow-input:', i + 1)
+    return False
+
+def _match_number(text, i, needs_comma):
+    """
+    Reads a number at the given position (the same as float_regex).
+
+    Args:
+        text (str): The text.
+        i (int): The position of the number.
+        needs_comma (bool): Whether the number needs to be followed by a comma.
+
+    Returns:
+        int: The position after the number or -1 if there is not a number.
+    """
+    if i < len(text) and text[i] in '+-':
+        i += 1
+    integer_end = i
+    while integer_end < len(text) and text[integer_end].isdecimal():
+        integer_end += 1
+    end = -1
+    if integer_end < len(text) and text[integer_end] == '.':
+        decimal_end = integer_end + 1
+        while decimal_end < len(text) and text[decimal_end].isdecimal():
+            decimal_end += 1
+        if decimal_end > integer_end + 1:
+            end = decimal_end
+    if end == -1 or (needs_comma and not text.startswith(',', end)):
+        # Only the integer part
+        end = integer_end if integer_end > i else -1
+    if end != -1 and needs_comma and not text.startswith(',', end):
+        return -1
+    return end
+
+def _find_slider(post_param):
+    """
+    Finds the range of a slider, e.g. ('0', '10', '1') for min:0, max:10, step:1
+    (the same as the first match of min:(float_regex),\\s*max:(float_regex),\\s*step:(float_regex)).
+    """
+    i = post_param.find('min:')
+    while i != -1:
+        values = []
+        position = i
+        for key in ('min:', 'max:', 'step:'):
+            if values:
+                position = _skip_spaces(post_param, position + 1)
+                if not post_param.startswith(key, position):
+                    break
+            start = position + len(key)
+            end = _match_number(post_param, start, needs_comma=key != 'step:')
+            if end == -1:
+                break
+            values.append(post_param[start:end])
+            position = end
+        if len(values) == 3:
+            return tuple(values)
+        i = post_param.find('min:', i + 1)
+    return None
+
+def parse_param_line(line):
+    """
+    Parses a line with a Colab form parameter (e.g. epochs = 10 #@param {type:"integer"}) reading it only once,
+    in linear time, so that long lines (e.g. with huge lists of options) do not make the regular expressions backtrack.
+    The result is the same as the one of param_regex and the regular expressions used on the text after #@param.
+
+    Args:
+        line (str): The line of code.
+
+    Returns:
+        ParamInfo: The name of the variable, its default value, the text after #@param and its options (whether
+        it has a comment after them, the type, the list of options, whether new values are allowed and the range
+        of the slider), or None if the line does not follow the format.
+    """
+    i = 0
+    while i < len(line):
+        if not _is_word(line[i]):
+            i += 1
+            continue
+
+        # A variable name followed by =
+        start = i
+        while i < len(line) and _is_word(line[i]):
+            i += 1
+        equals = _skip_spaces(line, i)
+        if equals == len(line) or line[equals] != '=':
+            continue
+
+        # The default value goes until the first #@param after it (it needs at least one character)
+        value_start = _skip_spaces(line, equals + 1)
+        marker = line.find(param_marker, value_start + 1)
+        post_param = _find_post_param(line, marker + len(param_marker)) if marker != -1 else None
+        if post_param is None and value_start > equals + 1 and line.startswith(param_marker, value_start):
+            # Only #@param after the =, so the value is the last space before it
+            value_start, marker = value_start - 1, value_start
+            post_param = _find_post_param(line, marker + len(param_marker))
+        if post_param is None:
+            # Neither this variable nor the following ones can have a value
+            return None
+        value_end = marker
+        while value_end > value_start + 1 and line[value_end - 1].isspace():
+            value_end -= 1
+
+        return ParamInfo(line[start:i], line[value_start:value_end], post_param,
+                         _has_comment_after(post_param), _find_type(post_param),
+                         _find_list(post_param), _find_allow_input(post_param), _find_slider(post_param))
+    return None
+
+def _find_list(post_param):
+    """
+    Finds the list of options of the @param, e.g. ["unet", "vgg"] (the same as the first match of (\\[.*?\\])).
+    """
+    start = post_param.find('[')
+    end = post_param.find(']', start + 1) if start != -1 else -1
+    return post_param[start:end + 1] if end != -1 else None
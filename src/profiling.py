@@ -0,0 +1,117 @@
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+class Profiler:
+    """
+    Collects the wall-clock time of each stage of a transformation and the counters
+    of each converted cell, and exports them as JSON or as Chrome trace events.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.stages = []
+        self.cells = []
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measures the time spent in a stage of the transformation.
+
+        Args:
+            name (str): The name of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({"name": name, "start": start - self.origin,
+                                "seconds": time.perf_counter() - start})
+
+    def cell(self, cell_idx, cell_type, start, source, new_cells):
+        """
+        Records the counters of a converted cell.
+
+        Args:
+            cell_idx (int): Index of the cell in the original notebook.
+            cell_type (str): Type of the cell.
+            start (float): Value of time.perf_counter() when the conversion of the cell started.
+            source (str): Source of the original cell.
+            new_cells (list): The cells generated from it.
+        """
+        new_source = ''.join(new_cell.source for new_cell in new_cells)
+        self.cells.append({"cell": cell_idx,
+                           "cell_type": cell_type,
+                           "start": start - self.origin,
+                           "seconds": time.perf_counter() - start,
+                           "lines": source.count('\n') + 1,
+                           "params": source.count('#@param'),
+                           "widgets": new_source.count('display(widget_')})
+
+    def slowest_cells(self, count=10):
+        """
+        Args:
+            count (int): Number of cells to return.
+
+        Returns:
+            list: The counters of the slowest cells, from the slowest one.
+        """
+        return sorted(self.cells, key=lambda cell: cell["seconds"], reverse=True)[:count]
+
+    def report(self):
+        """
+        Returns:
+            dict: The time of each stage, the totals of the counters, the slowest cells and the counters of every cell.
+        """
+        return {"stages": {stage["name"]: stage["seconds"] for stage in self.stages},
+                "totals": {"cells": len(self.cells),
+                           "lines": sum(cell["lines"] for cell in self.cells),
+                           "params": sum(cell["params"] for cell in self.cells),
+                           "widgets": sum(cell["widgets"] for cell in self.cells)},
+                "slowest_cells": self.slowest_cells(),
+                "cells": self.cells}
+
+    def chrome_trace(self):
+        """
+        Returns:
+            dict: The stages and cells as complete events of the Chrome trace event format
+            (it can be opened with chrome://tracing or https://ui.perfetto.dev).
+        """
+        events = [{"name": stage["name"], "cat": "stage", "ph": "X", "pid": 1, "tid": 1,
+                   "ts": stage["start"] * 1e6, "dur": stage["seconds"] * 1e6}
+                  for stage in self.stages]
+        events += [{"name": f"cell {cell['cell']} ({cell['cell_type']})", "cat": "cell", "ph": "X", "pid": 1, "tid": 2,
+                    "ts": cell["start"] * 1e6, "dur": cell["seconds"] * 1e6,
+                    "args": {key: cell[key] for key in ("lines", "params", "widgets")}}
+                   for cell in self.cells]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, path, trace_format="json"):
+        """
+        Saves the profile to a file.
+
+        Args:
+            path (str): Path of the file.
+            trace_format (str): 'json' for the report or 'chrome' for Chrome trace events.
+        """
+        data = self.chrome_trace() if trace_format == "chrome" else self.report()
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+class NullProfiler:
+    """
+    Profiler that does nothing, used when the profiling is disabled so that it has almost no overhead.
+    """
+
+    enabled = False
+    _context = nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+    def cell(self, cell_idx, cell_type, start, source, new_cells):
+        pass
+
+null_profiler = NullProfiler()
@@ -1,81 +1,176 @@
+import re
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
 
-def calculate_next_section(current_section):
+from markdown_utils import section_regex
+
+# Entry of the section index: the section name, its depth, the text of its heading and its (start, end) cell range
+SectionInfo = namedtuple('SectionInfo', ['name', 'depth', 'heading', 'start', 'end'])
+
+def parse_section(section):
     """
-    Generates the next section based on the current section. The section needs to follow
+    Converts a section name into the tuple of its numbers. The section needs to follow
     the format X.X. (e.g. 1.1., 2., 3.1.2., etc.)
 
     Args:
-        current_section (str): The current section to calculate the next section from.
+        section (str): The section name.
 
     Returns:
-        str: The next section.
+        tuple: The numbers of the section (e.g. (3, 1, 2) for 3.1.2.) or None if it does not follow the format.
     """
-    current_section_parts = current_section.split('.')
-    next_section_parts = current_section_parts.copy()
-    next_section_parts[-2] = str(int(next_section_parts[-2]) + 1)
-    next_section = '.'.join(next_section_parts)
-    return next_section
+    parts = section.split('.')
+    if len(parts) < 2 or parts[-1] != '' or not all(part.isdigit() for part in parts[:-1]):
+        return None
+    return tuple(int(part) for part in parts[:-1])
 
-def find_matching_prefix(string1, string2):
+def format_section(numbers):
     """
-    Find the longest common prefix between two strings.
-    
+    Converts the tuple of numbers of a section into its name (the inverse of parse_section).
+
     Args:
-        string1 (str): The first string.
-        string2 (str): The second string.
-    
+        numbers (tuple): The numbers of the section.
+
     Returns:
-        str: The longest common prefix between the two strings.
+        str: The section name (e.g. 3.1.2. for (3, 1, 2)).
     """
-    matching_prefix = ""
-    for i in range(min(len(string1), len(string2))):
-        if string1[i] == string2[i]:
-            matching_prefix += string1[i]
-        else:
-            break
-    return matching_prefix
+    return ''.join(f'{number}.' for number in numbers)
 
-def update_cell_sections(cells, section_localizer, section_to_rmv, next_section):
+def build_section_index(section_localizer, num_cells):
     """
-    Updates the cell sections in the given list of cells.
+    Builds an interval index of the numbered sections: the range of cells that each section spans.
+    A section spans from its heading until the heading of the next section that is not one of its
+    subsections (or until the end of the notebook).
 
     Args:
-        cells (list): A list of cells to be updated.
-        section_localizer (dict): A dictionary mapping section names to their corresponding cell indices.
-        section_to_rmv (str): The section to be removed.
-        next_section (str): The section that will follow the removed section.
+        section_localizer (dict): A dictionary mapping section names to cell indices.
+        num_cells (int): The number of cells of the notebook.
 
     Returns:
-        tuple: A tuple containing the updated list of cells and the updated section localizer dictionary.
+        dict: A dictionary mapping the tuple of numbers of each section to its (start, end) cell range.
     """
-    # Copy the cells and sections (that will be modified)
-    updated_cells = cells.copy()
-    updated_section_localizer = section_localizer.copy()
+    numbered_sections = sorted((numbers, section_localizer[section])
+                               for section in section_localizer
+                               if (numbers := parse_section(section)) is not None)
+    keys = [numbers for numbers, _ in numbered_sections]
 
-    # Get the number of cells that will be removed
-    num_removed_cells = section_localizer[next_section] - section_localizer[section_to_rmv]
-    matching_section = find_matching_prefix(section_to_rmv, next_section)
+    section_index = {}
+    for i, (numbers, start) in enumerate(numbered_sections):
+        # The first section after all the subsections of this one (that start with the same numbers)
+        next_i = bisect_right(keys, numbers + (float('inf'),), lo=i + 1)
+        end = numbered_sections[next_i][1] if next_i < len(numbered_sections) else num_cells
+        section_index[numbers] = (start, max(start, end))
+    return section_index
 
-    # Look all the sections and remove the matching section
-    for section in section_localizer:
-        if section.startswith(section_to_rmv):
-            updated_section_localizer.pop(section)
-    
-    # The numbers of sections after the removed section need to be updated
-    since_section = next_section.replace(matching_section, '', 1)
-    since_section_part = since_section.split('.')
+def section_heading(source, section):
+    """
+    Extracts the text of the heading of a section from the source of its markdown cell.
+
+    Args:
+        source (str): The source of the markdown cell.
+        section (str): The section name.
+
+    Returns:
+        str: The text of the heading, without the #, the section name and the bold marks.
+    """
+    for line in source.split('\n'):
+        section_match = re.match(section_regex, line)
+        if section_match and section_match.group(1) == section:
+            return line[section_match.end():].strip().strip('*').strip()
+    return ''
+
+def list_sections(cells, section_localizer):
+    """
+    Builds the hierarchical index of the numbered sections of a notebook.
+
+    Args:
+        cells (list): The cells of the notebook.
+        section_localizer (dict): A dictionary mapping section names to cell indices.
+
+    Returns:
+        list: A SectionInfo (name, depth, heading and cell range) per numbered section, in order.
+    """
+    section_index = build_section_index(section_localizer, len(cells))
+    return [SectionInfo(format_section(numbers), len(numbers),
+                        section_heading(cells[start].source, format_section(numbers)) if start < len(cells) else '',
+                        start, end)
+            for numbers, (start, end) in sorted(section_index.items())]
+
+def sections_not_kept(section_localizer, keep_list):
+    """
+    Finds the sections to remove so that only the given ones are kept (with their subsections
+    and the sections that contain them, so that their headings are kept too).
+
+    Args:
+        section_localizer (dict): A dictionary mapping section names to cell indices.
+        keep_list (list): A list of section names to keep.
+
+    Returns:
+        list: The names of the sections to remove.
+    """
+    keep_numbers = []
+    for section in keep_list:
+        numbers = parse_section(section)
+        if numbers is None or format_section(numbers) not in section_localizer:
+            raise KeyError(section)
+        keep_numbers.append(numbers)
+
+    sections_to_rmv = []
     for section in section_localizer:
-        if section.startswith(matching_section):
-            acual_section = section.replace(matching_section, '', 1)
-            acual_section_part = acual_section.split('.')
-            if acual_section_part[0] >= since_section_part[0]:
-                cell_id = updated_section_localizer.pop(section)
-                updated_section = matching_section + '.'.join([str(int(acual_section_part[0])-1)] + acual_section_part[1:])
-                updated_section_localizer[updated_section] = cell_id - num_removed_cells
-                updated_cells[cell_id - num_removed_cells].source = updated_cells[cell_id - num_removed_cells].source.replace(section, updated_section, 1)
+        numbers = parse_section(section)
+        if numbers is None:
+            continue
+        # Kept if it is inside a kept section or contains one
+        if not any(numbers[:len(keep)] == keep or keep[:len(numbers)] == numbers for keep in keep_numbers):
+            sections_to_rmv.append(section)
+    return sections_to_rmv
 
+def split_sections(cells, section_localizer, level=1):
+    """
+    Splits the cells of a notebook into one list of cells per section of the given level. Each list has the
+    cells before the first section (the setup shared by all of them), the cells of the sections that contain
+    the section before their first subsection, and the cells of the section itself.
+    A section of a lower depth without subsections (e.g. 3. when splitting by 2.1., 2.2., ...) is a part
+    on its own, so that no cell is lost.
 
-    return updated_cells, updated_section_localizer
+    Args:
+        cells (list): The cells of the notebook.
+        section_localizer (dict): A dictionary mapping section names to cell indices.
+        level (int): The depth of the sections to split (1 for the top level sections).
+
+    Returns:
+        list: A tuple (SectionInfo, list of cells) per section of the given level (or shallower section
+        without subsections), in order.
+    """
+    sections = list_sections(cells, section_localizer)
+    first_start = min((section.start for section in sections), default=len(cells))
+    setup = cells[:first_start]
+
+    # Start of the first subsection of each section, where its introduction ends, and the sections
+    # with subsections of the given level or a lower depth (they are split into them)
+    intro_ends = {}
+    split_parents = set()
+    for section in sections:
+        numbers = parse_section(section.name)
+        for depth in range(1, len(numbers)):
+            parent = format_section(numbers[:depth])
+            intro_ends[parent] = min(intro_ends.get(parent, section.start), section.start)
+            if section.depth <= level:
+                split_parents.add(parent)
+
+    parts = []
+    ancestors = {}
+    for section in sections:
+        ancestors[section.depth] = section
+        if section.depth > level or (section.depth < level and section.name in split_parents):
+            continue
+        part = list(setup)
+        for depth in range(1, section.depth):
+            if depth in ancestors and section.name.startswith(ancestors[depth].name):
+                ancestor = ancestors[depth]
+                part.extend(cells[ancestor.start:intro_ends.get(ancestor.name, ancestor.end)])
+        part.extend(cells[section.start:section.end])
+        parts.append((section, part))
+    return parts
 
 def remove_section(cells, section_localizer, section_to_rmv):
     """
@@ -89,34 +184,13 @@ def remove_section(cells, section_localizer, section_to_rmv):
     Returns:
         tuple: A tuple containing the updated list of cells and the updated section localizer.
     """
-    # Get the index of the section to remove
-    cell_idx_to_rmv = section_localizer[section_to_rmv]
-
-    # Calculate the name of the next section
-    next_section = calculate_next_section(section_to_rmv)
-
-    # Find the next section that exists in the section localizer
-    while next_section not in section_localizer:
-        # Calculate the name of the new next section
-        new_next_section = '.'.join(next_section.split('.')[:-2]) + '.'
-        if new_next_section == '.':
-            next_section = section_to_rmv
-        next_section = calculate_next_section(new_next_section)
-        
-    # Get the index of the next section
-    next_section_cell_idx = section_localizer[next_section]
-
-    # Remove the section from the list of cells
-    reduced_cells = cells[:cell_idx_to_rmv] + cells[next_section_cell_idx:]
-
-    # Update the cell sections and section localizer
-    updated_cells, updated_section_localizer = update_cell_sections(reduced_cells, section_localizer, 
-                                                                    section_to_rmv, next_section)
-    return updated_cells, updated_section_localizer
+    return remove_section_list(cells, section_localizer, [section_to_rmv])
 
 def remove_section_list(cells, section_localizer, section_list):
     """
-    Remove sections from a list of cells and their localizers.
+    Remove sections from a list of cells and their localizers. All the removals are computed together
+    from the section index, the cells are dropped in one pass and the remaining sections are renumbered once
+    (e.g. removing 1.1. renames 1.2. as 1.1. and 1.2.1. as 1.1.1.).
 
     Parameters:
         cells (list): A list of cells.
@@ -126,8 +200,84 @@ def remove_section_list(cells, section_localizer, section_list):
     Returns:
         tuple: A tuple containing the modified list of cells and the updated section localizer dictionary.
     """
-    sorted_sections = sorted(section_list, key=lambda x: [int(num) for num in x.split('.')[:-1]], reverse=True)
-    for section in sorted_sections:
-        cells, section_localizer = remove_section(cells.copy(), section_localizer.copy(), section)
+    if not section_list:
+        return cells, section_localizer
+
+    section_index = build_section_index(section_localizer, len(cells))
+
+    # Numbers of the sections to remove, ignoring the ones inside another removed section
+    sections_to_rmv = []
+    for section in section_list:
+        numbers = parse_section(section)
+        if numbers not in section_index:
+            raise KeyError(section)
+        sections_to_rmv.append(numbers)
+    sections_to_rmv.sort()
+    top_sections_to_rmv = []
+    for numbers in sections_to_rmv:
+        if not top_sections_to_rmv or numbers[:len(top_sections_to_rmv[-1])] != top_sections_to_rmv[-1]:
+            top_sections_to_rmv.append(numbers)
+
+    # Cell ranges that will be removed (merged and sorted) and the removed sections grouped by their parent
+    removed_ranges = []
+    removed_siblings = {}
+    for numbers in top_sections_to_rmv:
+        start, end = section_index[numbers]
+        if removed_ranges and start <= removed_ranges[-1][1]:
+            removed_ranges[-1] = (removed_ranges[-1][0], max(end, removed_ranges[-1][1]))
+        else:
+            removed_ranges.append((start, end))
+        removed_siblings.setdefault(numbers[:-1], []).append(numbers[-1])
+    for siblings in removed_siblings.values():
+        siblings.sort()
+
+    # Number of removed cells before the end of each removed range
+    removed_ends = [end for _, end in removed_ranges]
+    removed_before = []
+    total_removed = 0
+    for start, end in removed_ranges:
+        total_removed += end - start
+        removed_before.append(total_removed)
 
-    return cells, section_localizer 
\ No newline at end of file
+    def new_cell_idx(cell_idx):
+        # Index of a kept cell once the removed ranges are dropped
+        i = bisect_right(removed_ends, cell_idx)
+        return cell_idx - (removed_before[i - 1] if i else 0)
+
+    def is_removed(cell_idx):
+        i = bisect_right(removed_ends, cell_idx)
+        return i < len(removed_ranges) and removed_ranges[i][0] <= cell_idx
+
+    # Drop the removed cells in one pass
+    updated_cells = []
+    range_i = 0
+    for cell_idx, cell in enumerate(cells):
+        while range_i < len(removed_ranges) and removed_ranges[range_i][1] <= cell_idx:
+            range_i += 1
+        if range_i < len(removed_ranges) and removed_ranges[range_i][0] <= cell_idx:
+            continue
+        updated_cells.append(cell)
+
+    # Renumber the remaining sections: each number decreases by the amount of removed sections
+    # with the same parent and a lower number. Sections are visited in ascending order so that
+    # a renamed heading never matches another section of the same cell.
+    updated_section_localizer = {}
+    for section, cell_idx in sorted(section_localizer.items(), key=lambda item: (item[1], parse_section(item[0]) or ())):
+        numbers = parse_section(section)
+        if numbers is None:
+            # Not numbered sections are only moved
+            if not is_removed(cell_idx):
+                updated_section_localizer[section] = new_cell_idx(cell_idx)
+            continue
+        if is_removed(cell_idx):
+            continue
+
+        updated_numbers = tuple(number - bisect_left(removed_siblings.get(numbers[:level], []), number)
+                                for level, number in enumerate(numbers))
+        updated_idx = new_cell_idx(cell_idx)
+        updated_section = format_section(updated_numbers)
+        if updated_section != section:
+            updated_cells[updated_idx].source = updated_cells[updated_idx].source.replace(section, updated_section, 1)
+        updated_section_localizer[updated_section] = updated_idx
+
+    return updated_cells, updated_section_localizer
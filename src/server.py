@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import threading
+import socketserver
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import nbformat
+
+from transform import transform_notebook, transform_file, colabless_path, _get_cache
+
+def run_job(job, cache_path=None, cache_bytes=None):
+    """
+    Runs a conversion job. The job can give the path of the notebook (and optionally the output path)
+    or the notebook itself, inline, in which case the transformed notebook is returned in the result.
+
+    Args:
+        job (dict): The job, with the keys 'id', 'path' or 'notebook' (as JSON object or string), 'output',
+            'remove_sections', 'stream', 'code_options' (extra options of code_to_cell) and 'assets_dir'.
+        cache_path (str): Path of the cache database (if None, no cache is used).
+        cache_bytes (int): Maximum size of the cache, in bytes.
+
+    Returns:
+        dict: The result of the job, with its id, status, error, elapsed time and output path or notebook.
+    """
+    start = time.perf_counter()
+    result = {"id": job.get("id")}
+    try:
+        cache = _get_cache(cache_path, cache_bytes)
+        remove_sections = job.get("remove_sections", [])
+        code_options = job.get("code_options")
+        assets_dir = job.get("assets_dir")
+        if "notebook" in job:
+            # Read like a file, so that the sources stored as lists of lines are joined
+            notebook = job["notebook"]
+            colab_nb = nbformat.reads(notebook if isinstance(notebook, str) else json.dumps(notebook), as_version=4)
+            result["notebook"] = transform_notebook(colab_nb, remove_sections=remove_sections, cache=cache,
+                                                    code_options=code_options, assets_dir=assets_dir)
+        elif "path" in job:
+            output = job.get("output") or colabless_path(job["path"])
+            transform_file(job["path"], output, remove_sections=remove_sections, cache=cache,
+                           stream=job.get("stream", False), code_options=code_options, assets_dir=assets_dir)
+            result["output"] = output
+        else:
+            raise ValueError("The job needs a 'path' or a 'notebook'")
+        result["status"], result["error"] = "success", None
+    except Exception as e:
+        result["status"], result["error"] = "failure", f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+class ConversionServer:
+    """
+    Long-lived conversion worker: it keeps a pool of warm processes (with nbformat already imported)
+    and runs the jobs it receives as JSON lines concurrently, writing back one JSON line per result
+    as soon as it finishes (so the results can arrive in a different order than the jobs).
+
+    Args:
+        workers (int): Number of worker processes (by default, the number of CPUs).
+        cache_path (str): Path of the cache database shared by the workers (if None, no cache is used).
+        cache_bytes (int): Maximum size of the cache, in bytes.
+    """
+
+    def __init__(self, workers=None, cache_path=None, cache_bytes=256 * 1024 * 1024):
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.cache_path = cache_path
+        self.cache_bytes = cache_bytes
+
+    def submit(self, line, write, pending):
+        """
+        Parses a JSON line with a job and runs it in the pool of processes.
+
+        Args:
+            line (str): The JSON line with the job.
+            write (callable): Function called with the JSON line of the result.
+            pending (set): Set with the futures of the jobs that have not finished yet.
+
+        Returns:
+            None
+        """
+        if not line.strip():
+            return
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("The job needs to be a JSON object")
+        except ValueError as e:
+            write(json.dumps({"id": None, "status": "failure", "error": f"{type(e).__name__}: {e}", "seconds": 0.0}))
+            return
+
+        def done(future):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process died (e.g. out of memory)
+                result = {"id": job.get("id"), "status": "failure", "error": f"{type(e).__name__}: {e}", "seconds": 0.0}
+            write(json.dumps(result))
+            pending.discard(future)
+
+        future = self.executor.submit(run_job, job, self.cache_path, self.cache_bytes)
+        pending.add(future)
+        future.add_done_callback(done)
+
+    def serve_stdio(self, input_file=sys.stdin, output_file=sys.stdout):
+        """
+        Reads the jobs from the input file (one JSON line each) until it ends,
+        and writes the results to the output file.
+
+        Args:
+            input_file (file-like): Text file with the jobs.
+            output_file (file-like): Text file where the results are written.
+        """
+        lock = threading.Lock()
+
+        def write(line):
+            with lock:
+                output_file.write(line + '\n')
+                output_file.flush()
+
+        pending = set()
+        for line in input_file:
+            self.submit(line, write, pending)
+        wait(list(pending))
+
+    def serve_unix(self, socket_path):
+        """
+        Listens on a Unix socket. Each connection sends jobs as JSON lines and
+        receives the results on the same connection.
+
+        Args:
+            socket_path (str): Path of the Unix socket.
+        """
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                lock = threading.Lock()
+
+                def write(line):
+                    with lock:
+                        try:
+                            self.wfile.write((line + '\n').encode('utf-8'))
+                            self.wfile.flush()
+                        except OSError:
+                            # The client closed the connection
+                            pass
+
+                pending = set()
+                for line in self.rfile:
+                    server.submit(line.decode('utf-8'), write, pending)
+                wait(list(pending))
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as unix_server:
+            unix_server.daemon_threads = True
+            try:
+                unix_server.serve_forever()
+            finally:
+                os.remove(socket_path)
+
+    def close(self):
+        self.executor.shutdown()
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Long-lived worker that converts colab notebooks received as JSON lines",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-u", "--unix-socket", help="path of the Unix socket to listen on (by default, stdin/stdout are used)")
+    parser.add_argument("-w", "--workers", help="number of worker processes, by default the number of CPUs", type=int)
+    parser.add_argument("--cache", help="SQLite file used as persistent cache of the converted cells")
+    parser.add_argument("--cache-size", help="maximum size of the cache in MB", type=int, default=256)
+    args = vars(parser.parse_args())
+
+    server = ConversionServer(workers=args["workers"], cache_path=args["cache"],
+                              cache_bytes=args["cache_size"] * 1024 * 1024)
+    try:
+        if args["unix_socket"]:
+            server.serve_unix(args["unix_socket"])
+        else:
+            server.serve_stdio()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import io
+import os
+import re
+import json
+from contextlib import contextmanager
+
+import nbformat
+
+# Usefull regular expressions
+whitespace_regex = r'[ \t\n\r]*'
+string_content_regex = r'[^"\\]*'
+structural_regex = r'["\[\]{}]'
+
+whitespace_pattern = re.compile(whitespace_regex)
+string_content_pattern = re.compile(string_content_regex)
+structural_pattern = re.compile(structural_regex)
+
+class _JSONStream:
+    """
+    Minimal incremental reader of a JSON document. Only the part of the file that is being
+    parsed is kept in memory, and values can be skipped without being materialized.
+
+    Args:
+        file (file-like): Text file with the JSON document.
+        chunk_size (int): Number of characters read from the file each time.
+    """
+
+    def __init__(self, file, chunk_size=1 << 16):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=None):
+        """
+        Reads more characters from the file, discarding the ones that have already been parsed.
+
+        Args:
+            size (int): Number of characters to read (by default, chunk_size).
+
+        Returns:
+            bool: False if the end of the file was reached, True otherwise.
+        """
+        if self.eof:
+            return False
+        data = self.file.read(size or self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skips the whitespace and returns the next character (without consuming it).
+
+        Returns:
+            str: The next character or '' at the end of the file.
+        """
+        while True:
+            self.pos = whitespace_pattern.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, characters):
+        """
+        Consumes the next character, that needs to be one of the given ones.
+
+        Args:
+            characters (str): The allowed characters.
+
+        Returns:
+            str: The consumed character.
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(f"Expected one of {characters!r} at the notebook but found {character!r}")
+        self.pos += 1
+        return character
+
+    def read_value(self):
+        """
+        Parses the next JSON value, reading from the file until the value is complete.
+
+        Returns:
+            The parsed value.
+        """
+        self.peek()
+        decoder = json.JSONDecoder()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Read as many characters as already buffered, so that big values are read in few steps
+            self.fill(max(self.chunk_size, len(self.buffer) - self.pos))
+
+    def skip_string(self):
+        """
+        Skips a JSON string (the opening quote has already been consumed) without keeping it in memory.
+
+        Returns:
+            None
+        """
+        while True:
+            self.pos = string_content_pattern.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) and self.buffer[self.pos] == '"':
+                self.pos += 1
+                return
+            if self.pos + 1 < len(self.buffer):
+                # Escaped character
+                self.pos += 2
+            elif not self.fill():
+                raise ValueError("Unterminated string at the notebook")
+
+    def skip_value(self):
+        """
+        Skips the next JSON value without materializing it.
+
+        Returns:
+            None
+        """
+        if self.peek() not in '[{':
+            self.read_value()
+            return
+
+        depth = 0
+        while True:
+            match = structural_pattern.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                if not self.fill():
+                    raise ValueError("Unexpected end of the notebook")
+                continue
+
+            self.pos = match.end()
+            character = match.group(0)
+            if character == '"':
+                self.skip_string()
+            elif character in '[{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+def is_binary_file(file):
+    """
+    Checks if a file-like object works with bytes instead of text.
+
+    Args:
+        file (file-like): The file-like object.
+
+    Returns:
+        bool: True if it reads and writes bytes, False if it reads and writes text.
+    """
+    if isinstance(file, io.TextIOBase):
+        return False
+    if isinstance(file, (io.BufferedIOBase, io.RawIOBase)):
+        return True
+    return 'b' in getattr(file, 'mode', '')
+
+@contextmanager
+def open_text(source):
+    """
+    Opens a path or wraps a file-like object so that it is read as UTF-8 text.
+    The file-like objects given by the caller are never closed.
+
+    Args:
+        source (str or file-like): Path of the file or file-like object (text or binary).
+
+    Yields:
+        file-like: The text file.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, encoding='utf-8') as f:
+            yield f
+    elif is_binary_file(source):
+        wrapper = io.TextIOWrapper(source, encoding='utf-8')
+        try:
+            yield wrapper
+        finally:
+            # Detached, so that the binary file is not closed with the wrapper
+            wrapper.detach()
+    else:
+        yield source
+
+def _read_cell(stream, skip_keys):
+    """
+    Parses a cell of the notebook, skipping the given keys.
+
+    Args:
+        stream (_JSONStream): The stream positioned at the beginning of the cell.
+        skip_keys (tuple): Keys of the cell that are not materialized.
+
+    Returns:
+        NotebookNode: The parsed cell.
+    """
+    cell = {}
+    stream.expect('{')
+    if stream.peek() == '}':
+        stream.expect('}')
+        return nbformat.from_dict(cell)
+
+    while True:
+        key = stream.read_value()
+        stream.expect(':')
+        if key in skip_keys:
+            stream.skip_value()
+        else:
+            cell[key] = stream.read_value()
+        if stream.expect(',}') == '}':
+            break
+
+    # The source can be stored as a list of lines
+    if isinstance(cell.get('source'), list):
+        cell['source'] = ''.join(cell['source'])
+    return nbformat.from_dict(cell)
+
+def stream_cells(source, skip_keys=('outputs',), chunk_size=1 << 16):
+    """
+    Reads the cells of a notebook one at a time, without loading the whole document into memory.
+    The outputs of the cells are skipped without being parsed, so the memory needed is bounded by
+    the largest cell (without its outputs) instead of by the size of the file.
+    Only notebooks with format version 4 are supported.
+
+    Args:
+        source (str or file-like): Path to the Jupyter notebook file or file-like object with it.
+        skip_keys (tuple): Keys of the cells that are not read.
+        chunk_size (int): Number of characters read from the file each time.
+
+    Yields:
+        NotebookNode: Each cell of the notebook, in order.
+    """
+    with open_text(source) as f:
+        stream = _JSONStream(f, chunk_size=chunk_size)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+
+        while True:
+            key = stream.read_value()
+            stream.expect(':')
+            if key == 'cells':
+                stream.expect('[')
+                if stream.peek() == ']':
+                    stream.expect(']')
+                else:
+                    while True:
+                        yield _read_cell(stream, skip_keys)
+                        if stream.expect(',]') == ']':
+                            break
+            elif key == 'nbformat':
+                version = stream.read_value()
+                if version != 4:
+                    raise ValueError(f"Only notebooks with format version 4 can be streamed, found {version}")
+            else:
+                stream.skip_value()
+
+            if stream.expect(',}') == '}':
+                break
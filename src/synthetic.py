@@ -0,0 +1,145 @@
+import random
+
+import nbformat
+
+# Lines with every #@param form that the conversion handles (the {i} is replaced to get unique variable names)
+param_lines = [
+    'slider_int_{i} = 5 #@param {{type:"slider", min:0, max:10, step:1}}',
+    'slider_float_{i} = 0.5 #@param {{type:"slider", min:0.0, max:1.0, step:0.1}}',
+    'integer_{i} = 10 #@param {{type:"integer"}}',
+    'number_int_{i} = 3 #@param {{type:"number"}}',
+    'number_float_{i} = 0.001 #@param {{type:"number"}}',
+    'boolean_{i} = True #@param {{type:"boolean"}}',
+    'string_{i} = "model_{i}" #@param {{type:"string"}}',
+    'raw_{i} = [1, 2, 3] #@param {{type:"raw"}}',
+    'date_{i} = "2023-07-01" #@param {{type:"date"}}',
+    'dropdown_{i} = "unet" #@param ["unet", "resnet", "vgg"]',
+    'raw_dropdown_{i} = 2 #@param [1, 2, 3] {{type:"raw"}}',
+    'combobox_{i} = "adam" #@param ["adam", "sgd"] {{allow-input: true}}',
+    'comment_after_{i} = 7 #@param {{type:"raw"}} # Comment after the param',
+]
+
+# Installation lines that the conversion removes
+install_lines = [
+    '!pip install numpy',
+    '!pip install -q tensorflow==2.12',
+    '!conda install -y scikit-image',
+]
+
+# Blocks of plain code (assignations, functions and other statements), always added whole so that the cells
+# are valid Python, and only using the names that the same block defines
+code_blocks = [
+    ['x_{i} = list(range({i} % 10 + 2))',
+     'a_{i}, b_{i} = x_{i}[0], x_{i}[1]'],
+    ['def process_{i}(data):',
+     '    result = [value * 2 for value in data]',
+     '    return result',
+     'print(process_{i}([{i}, {i} + 1]))'],
+    ['# Just a comment'],
+    [''],
+]
+
+def make_code_source(rng, lines_per_cell, param_ratio, install_ratio, counter):
+    """
+    Generates the source of a code cell mixing params, installation lines and plain code.
+
+    Args:
+        rng (random.Random): The random generator.
+        lines_per_cell (int): Number of lines of the cell.
+        param_ratio (float): Proportion of lines with #@param.
+        install_ratio (float): Proportion of installation lines.
+        counter (list): One element list with the counter used to get unique names.
+
+    Returns:
+        str: The source of the code cell.
+    """
+    lines = []
+    while len(lines) < lines_per_cell:
+        counter[0] += 1
+        choice = rng.random()
+        if choice < param_ratio:
+            # Every #@param form appears in order, so all of them are covered
+            templates = [param_lines[counter[0] % len(param_lines)]]
+        elif choice < param_ratio + install_ratio:
+            templates = [rng.choice(install_lines)]
+        else:
+            templates = code_blocks[counter[0] % len(code_blocks)]
+            if len(templates) > lines_per_cell - len(lines):
+                # The block does not fit in the cell
+                templates = ['# Just a comment']
+        lines.extend(template.format(i=counter[0]) for template in templates)
+    return '\n'.join(lines)
+
+def make_colab_notebook(num_sections=20, depth=3, cells_per_section=2, lines_per_cell=20,
+                        param_ratio=0.2, install_ratio=0.02, seed=0):
+    """
+    Generates a reproducible Colab notebook with numbered sections (up to the given depth) that contain
+    code cells with every #@param form handled by the conversion, installation lines and plain code.
+
+    Args:
+        num_sections (int): Total number of numbered sections.
+        depth (int): Maximum depth of the numbered sections (e.g. 3 generates up to 1.1.1.).
+        cells_per_section (int): Number of code cells after each heading.
+        lines_per_cell (int): Number of lines of each code cell.
+        param_ratio (float): Proportion of lines with #@param.
+        install_ratio (float): Proportion of installation lines.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        NotebookNode: The generated notebook.
+    """
+    rng = random.Random(seed)
+    counter = [0]
+
+    nb = nbformat.v4.new_notebook()
+    nb.metadata["colab"] = {"provenance": []}
+
+    # The first section has every #@param form, so they are always covered
+    numbers = [1]
+    for i in range(num_sections):
+        if i > 0:
+            # Go deeper, stay at the same level or go back to an upper level
+            move = rng.random()
+            if move < 0.4 and len(numbers) < depth:
+                numbers.append(1)
+            elif move < 0.7 or len(numbers) == 1:
+                numbers[-1] += 1
+            else:
+                numbers.pop()
+                numbers[-1] += 1
+
+        section = ''.join(f'{number}.' for number in numbers)
+        heading = '#' * len(numbers) + f' **{section} Section {i}**'
+        nb.cells.append(nbformat.v4.new_markdown_cell(heading + '\nSome explanation of the section.'))
+
+        if i == 0:
+            nb.cells.append(nbformat.v4.new_code_cell('\n'.join(line.format(i=0) for line in param_lines)))
+        for _ in range(cells_per_section):
+            source = make_code_source(rng, lines_per_cell, param_ratio, install_ratio, counter)
+            nb.cells.append(nbformat.v4.new_code_cell(source))
+
+    # Fixed cell ids, so that the same parameters always generate the same file
+    for cell_idx, cell in enumerate(nb.cells):
+        cell.id = f'cell-{cell_idx}'
+
+    return nb
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic colab notebook",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-o", "--output", help="path of the generated notebook", required=True)
+    parser.add_argument("--sections", help="number of numbered sections", type=int, default=20)
+    parser.add_argument("--depth", help="maximum depth of the numbered sections", type=int, default=3)
+    parser.add_argument("--cells", help="number of code cells per section", type=int, default=2)
+    parser.add_argument("--lines", help="number of lines per code cell", type=int, default=20)
+    parser.add_argument("--seed", help="seed of the random generator", type=int, default=0)
+    args = vars(parser.parse_args())
+
+    nb = make_colab_notebook(num_sections=args["sections"], depth=args["depth"], cells_per_section=args["cells"],
+                             lines_per_cell=args["lines"], seed=args["seed"])
+    nbformat.write(nb, args["output"])
+
+if __name__ == "__main__":
+    main()
@@ -1,79 +1,756 @@
 import nbformat
-from code_utils_one_cell import code_to_cell
-from markdown_utils import markdown_to_cell
-from sections import remove_section_list
+from code_utils_one_cell import code_to_cell, remove_ipywidget_import, add_ipywidget_import
+from markdown_utils import externalize_assets
+from sections import remove_section_list, sections_not_kept, list_sections, split_sections
+from cache import (ConversionCache, cached_code_to_cell, cached_markdown_to_cell,
+                   code_cache_key, get_code_cells, put_code_cells)
+from stream_reader import stream_cells, open_text, is_binary_file
+from profiling import Profiler, null_profiler
+from fast_writer import fast_write_notebook
+from docker_context import find_install_commands, merge_dependencies, write_docker_context
+
+import io
+import os
+import sys
+import glob
+import json
+import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 
 import nbformat
 
-def transform_nb(path_original_nb, path_new_nb, remove_sections=[]):
+def function_name(code, occurrences, code_options=None):
     """
-    Transforms a Jupyter notebook by converting code cells and markdown cells
-    according to specific rules and removes specified sections.
+    Chooses the name of the function of a code cell. With the widget runtime the name gets the hash of the code,
+    so the cells with the same code in a notebook (e.g. copies of a template) are numbered to keep their functions apart.
 
     Args:
-        path_original_nb (str): Path to the original Jupyter notebook file.
-        path_new_nb (str): Path to the new transformed Jupyter notebook file.
+        code (str): The code of the cell.
+        occurrences (dict): The number of times each code appeared before in the notebook (it is updated).
+        code_options (dict): Extra options of code_to_cell.
+
+    Returns:
+        str: The function name of the cell.
+    """
+    if not (code_options or {}).get("widget_runtime"):
+        return 'function'
+    occurrences[code] = occurrences.get(code, 0) + 1
+    return 'function' if occurrences[code] == 1 else f'function_{occurrences[code]}'
+
+def _code_to_cell_job(code, code_options, function_name='function'):
+    """
+    Converts a code cell independently of the rest of the notebook (the ipywidgets import is always added).
+
+    Args:
+        code (str): The code to be converted into code cells.
+        code_options (dict): Extra options of code_to_cell.
+        function_name (str): The name of the function of the cell.
+
+    Returns:
+        tuple: The list of code cells and whether they use widgets.
+    """
+    return code_to_cell(code, False, function_name=function_name, **code_options)
+
+def convert_code_cells(codes, code_options=None, jobs=2, cache=None):
+    """
+    First phase of the parallel conversion: converts the code cells independently with a pool of processes.
+    The cells that are in the cache are not sent to the pool, and the new ones are added to the cache.
+
+    Args:
+        codes (list): The code of each code cell.
+        code_options (dict): Extra options of code_to_cell.
+        jobs (int): Number of worker processes.
+        cache (ConversionCache): Optional cache with the already converted cells.
+
+    Returns:
+        list: The list of code cells and whether they use widgets, for each code.
+    """
+    code_options = code_options or {}
+    occurrences = {}
+    names = [function_name(code, occurrences, code_options) for code in codes]
+    results = [None] * len(codes)
+    missing = []
+    for i, code in enumerate(codes):
+        if cache is not None:
+            results[i] = get_code_cells(cache, code_cache_key(cache, code, False, names[i], code_options))
+        if results[i] is None:
+            missing.append(i)
+
+    if missing:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            chunksize = max(1, len(missing) // (jobs * 4))
+            converted = executor.map(_code_to_cell_job, [codes[i] for i in missing],
+                                     [code_options] * len(missing), [names[i] for i in missing],
+                                     chunksize=chunksize)
+            for i, (new_cells, uses_widgets) in zip(missing, converted):
+                results[i] = (new_cells, uses_widgets)
+                if cache is not None:
+                    put_code_cells(cache, code_cache_key(cache, codes[i], False, names[i], code_options),
+                                   new_cells, uses_widgets)
+    return results
+
+def convert_notebook(colab_nb, remove_sections=[], cache=None, profiler=null_profiler, code_options=None, jobs=1,
+                     assets_dir=None, assets_prefix=None, keep_sections=None, install_commands=None):
+    """
+    Transforms a notebook in memory by converting code cells and markdown cells
+    according to specific rules and removes specified sections, keeping the section localizer
+    built during the conversion.
+
+    Args:
+        colab_nb (NotebookNode): The original notebook (or an iterable of its cells, e.g. from stream_cells).
         remove_sections (list): List of section names to be removed.
+        cache (ConversionCache): Optional cache with the already converted cells.
+        profiler (Profiler): Optional profiler that measures each stage and cell.
+        code_options (dict): Extra options of code_to_cell (e.g. {'ast_globals': True}).
+        jobs (int): Number of processes that convert the code cells. With more than one, the code cells are
+            converted independently first, and then the ipywidgets import is kept only in the first cell
+            with widgets, giving the same result (the time of each cell is not profiled in this case).
+        assets_dir (str): Optional directory where the attachments and embedded images of the markdown cells
+            are saved (named by the hash of their content). If None, they are not kept.
+        assets_prefix (str): The path used to reference the saved assets in the markdown (by default, assets_dir).
+        keep_sections (list): Optional list of section names to keep (with their subsections and the sections
+            that contain them), removing the rest of the numbered sections.
+        install_commands (list): Optional list where the installation commands (pip or conda install) removed
+            from the code cells are added, as InstallCommand.
 
     Returns:
-        None
+        tuple: The transformed notebook and its section localizer (a dictionary mapping section names to cell indices).
     """
 
-    # Read the original notebook
-    colab_nb = nbformat.read(path_original_nb, as_version=4)
+    colab_cells = colab_nb.cells if isinstance(colab_nb, dict) else colab_nb
+    code_options = code_options or {}
+
+    converted_code = None
+    if jobs > 1:
+        colab_cells = list(colab_cells)
+        with profiler.stage("convert_code_parallel"):
+            codes = [cell.source for cell in colab_cells if cell.cell_type == "code"]
+            converted_code = iter(convert_code_cells(codes, code_options, jobs, cache))
 
     # Initialize variables
     section_localizer = {}
     cell_idx = 0
     ipywidget_imported = False
+    occurrences = {}
 
     # Create a new notebook
     new_nb = nbformat.v4.new_notebook()
 
     # Iterate over each cell in the original notebook
-    for cell in colab_nb.cells:
-        new_cells = []
-
-        # If the cell is a code cell
-        if cell.cell_type == "code":
-            code = cell.source
-            # Convert code to cells and track if ipywidgets is imported
-            new_cells, ipywidget_imported = code_to_cell(code, ipywidget_imported, function_name='function')
-
-        # If the cell is a markdown cell
-        elif cell.cell_type == "markdown":
-            text = cell.source
-            # Convert markdown to a cell
-            new_text, section_localizer = markdown_to_cell(text, section_localizer, cell_idx)
-            new_cells = [nbformat.v4.new_markdown_cell(new_text)]
-
-        # If new cells are created, add them to the new notebook
-        if new_cells:
-            new_nb.cells.extend(new_cells)
-            cell_idx += len(new_cells)
+    with profiler.stage("convert"):
+        for original_idx, cell in enumerate(colab_cells):
+            new_cells = []
+            start = time.perf_counter() if profiler.enabled and converted_code is None else None
+            if install_commands is not None and cell.cell_type == "code":
+                install_commands.extend(find_install_commands(cell.source))
+
+            # If the cell is a code cell
+            if cell.cell_type == "code" and converted_code is not None:
+                # Already converted in parallel, only the ipywidgets import of the first cell with widgets is kept
+                new_cells, uses_widgets = next(converted_code)
+                if uses_widgets:
+                    if ipywidget_imported:
+                        new_cells = remove_ipywidget_import(new_cells)
+                    ipywidget_imported = True
+
+            elif cell.cell_type == "code":
+                code = cell.source
+                # Convert code to cells and track if ipywidgets is imported
+                new_cells, ipywidget_imported = cached_code_to_cell(cache, code, ipywidget_imported,
+                                                                    function_name=function_name(code, occurrences, code_options),
+                                                                    **code_options)
+
+            # If the cell is a markdown cell
+            elif cell.cell_type == "markdown":
+                text = cell.source
+                # Convert markdown to a cell
+                new_text, section_localizer = cached_markdown_to_cell(cache, text, section_localizer, cell_idx)
+                if assets_dir is not None:
+                    # Keep the images saving them as files instead of embedding them in the notebook
+                    new_text = externalize_assets(new_text, cell.get("attachments"), assets_dir, assets_prefix)
+                new_cells = [nbformat.v4.new_markdown_cell(new_text)]
+
+            if start is not None:
+                profiler.cell(original_idx, cell.cell_type, start, cell.source, new_cells)
+
+            # If new cells are created, add them to the new notebook
+            if new_cells:
+                new_nb.cells.extend(new_cells)
+                cell_idx += len(new_cells)
+
+    if cache is not None:
+        # The accesses of the cells reused from the cache are written once per notebook
+        cache.flush()
 
     # Remove specified sections from the markdown cells in the new notebook
-    new_nb.cells, section_localizer = remove_section_list(cells=new_nb.cells,
-                                                          section_localizer=section_localizer,
-                                                          section_list=remove_sections)
+    with profiler.stage("remove_sections"):
+        if keep_sections is not None:
+            remove_sections = list(remove_sections) + sections_not_kept(section_localizer, keep_sections)
+        new_nb.cells, section_localizer = remove_section_list(cells=new_nb.cells,
+                                                              section_localizer=section_localizer,
+                                                              section_list=remove_sections)
+        if remove_sections:
+            # In case the first cell with widgets was removed
+            new_nb.cells = add_ipywidget_import(new_nb.cells)
 
-    # Save the new notebook to a file
-    nbformat.write(new_nb, path_new_nb)
+    return new_nb, section_localizer
+
+def transform_notebook(colab_nb, remove_sections=[], cache=None, profiler=null_profiler, code_options=None, jobs=1,
+                       assets_dir=None, assets_prefix=None, keep_sections=None, install_commands=None):
+    """
+    Transforms a notebook in memory by converting code cells and markdown cells
+    according to specific rules and removes specified sections.
+
+    Args:
+        colab_nb (NotebookNode): The original notebook (or an iterable of its cells, e.g. from stream_cells).
+        remove_sections (list): List of section names to be removed.
+        The rest of the arguments are the same as in convert_notebook.
+
+    Returns:
+        NotebookNode: The transformed notebook.
+    """
+    new_nb, _ = convert_notebook(colab_nb, remove_sections=remove_sections, cache=cache, profiler=profiler,
+                                 code_options=code_options, jobs=jobs, assets_dir=assets_dir,
+                                 assets_prefix=assets_prefix, keep_sections=keep_sections,
+                                 install_commands=install_commands)
+    return new_nb
+
+def split_notebook(colab_nb, level=1, **options):
+    """
+    Transforms a notebook and splits it into one notebook per section of the given level, all of them
+    with the cells before the first section. The notebook is converted only once.
+
+    Args:
+        colab_nb (NotebookNode): The original notebook (or an iterable of its cells, e.g. from stream_cells).
+        level (int): The depth of the sections to split (1 for the top level sections).
+        **options: The rest of the arguments of convert_notebook (e.g. remove_sections or cache).
+
+    Returns:
+        list: A tuple (SectionInfo, NotebookNode) per section of the given level.
+    """
+    new_nb, section_localizer = convert_notebook(colab_nb, **options)
+    notebooks = []
+    for section, cells in split_sections(new_nb.cells, section_localizer, level):
+        section_nb = nbformat.v4.new_notebook()
+        section_nb.cells = add_ipywidget_import(cells)
+        notebooks.append((section, section_nb))
+    return notebooks
+
+def read_cells(source, stream=False):
+    """
+    Reads the cells of a notebook from a path or a file-like object.
+
+    Args:
+        source (str or file-like): Path to the notebook file or file-like object (text or binary) with it.
+        stream (bool): Whether to read the cells one at a time, skipping their outputs.
+
+    Returns:
+        iterable: The cells of the notebook (a generator if stream is True).
+    """
+    if stream:
+        # The cells are parsed while they are converted, so the whole notebook is never in memory
+        return stream_cells(source)
+    with open_text(source) as f:
+        return nbformat.read(f, as_version=4).cells
+
+def write_notebook(new_nb, destination):
+    """
+    Writes a notebook to a path or a file-like object.
+
+    Args:
+        new_nb (NotebookNode): The notebook to write.
+        destination (str or file-like): Path of the notebook file or file-like object (text or binary).
+
+    Returns:
+        None
+    """
+    if isinstance(destination, (str, os.PathLike)):
+        nbformat.write(new_nb, destination)
+    elif is_binary_file(destination):
+        destination.write((nbformat.writes(new_nb) + '\n').encode('utf-8'))
+    else:
+        destination.write(nbformat.writes(new_nb) + '\n')
+
+def transform_file(source, destination, remove_sections=[], cache=None, stream=False, profiler=null_profiler,
+                   writer=write_notebook, code_options=None, jobs=1, assets_dir=None, assets_prefix=None, keep_sections=None,
+                   install_commands=None):
+    """
+    Transforms a notebook read from a path or file-like object and writes the result to another one.
+
+    Args:
+        source (str or file-like): Path to the original notebook file or file-like object with it.
+        destination (str or file-like): Path or file-like object where the transformed notebook is written.
+        remove_sections (list): List of section names to be removed.
+        cache (ConversionCache): Optional cache with the already converted cells.
+        stream (bool): Whether to read the cells one at a time, skipping their outputs.
+        profiler (Profiler): Optional profiler that measures each stage and cell
+            (when streaming, the reading of the cells is measured as part of the conversion).
+        writer (callable): Function that writes the notebook to the destination
+            (e.g. fast_write_notebook to skip the schema validation).
+        code_options (dict): Extra options of code_to_cell (e.g. {'ast_globals': True}).
+        jobs (int): Number of processes that convert the code cells of the notebook.
+        assets_dir (str): Optional directory where the attachments and embedded images of the markdown cells are saved.
+        assets_prefix (str): The path used to reference the saved assets (by default, the path of assets_dir
+            relative to the destination if it is a path, otherwise assets_dir).
+        keep_sections (list): Optional list of section names to keep, removing the rest of the numbered sections.
+        install_commands (list): Optional list where the removed installation commands are added.
+
+    Returns:
+        None
+    """
+    if assets_dir is not None and assets_prefix is None and isinstance(destination, (str, os.PathLike)):
+        assets_prefix = os.path.relpath(assets_dir, os.path.dirname(os.path.abspath(destination)))
+
+    # Read the original notebook
+    with profiler.stage("read"):
+        colab_cells = read_cells(source, stream=stream)
+
+    new_nb = transform_notebook(colab_cells, remove_sections=remove_sections, cache=cache, profiler=profiler,
+                                code_options=code_options, jobs=jobs, assets_dir=assets_dir,
+                                assets_prefix=assets_prefix, keep_sections=keep_sections,
+                                install_commands=install_commands)
+
+    # Save the new notebook (by default, nbformat validates it against the schema before writing it)
+    with profiler.stage("write"):
+        writer(new_nb, destination)
+
+def transform_bytes(data, remove_sections=[], cache=None, stream=False, profiler=null_profiler, writer=write_notebook,
+                    code_options=None, jobs=1, assets_dir=None, assets_prefix=None, keep_sections=None,
+                    install_commands=None):
+    """
+    Transforms a notebook given as bytes (e.g. the body of an upload) and returns the result as bytes.
+
+    Args:
+        data (bytes): The original notebook (JSON encoded as UTF-8).
+        remove_sections (list): List of section names to be removed.
+        cache (ConversionCache): Optional cache with the already converted cells.
+        stream (bool): Whether to read the cells one at a time, skipping their outputs.
+        profiler (Profiler): Optional profiler that measures each stage and cell.
+        writer (callable): Function that writes the notebook to the destination.
+        code_options (dict): Extra options of code_to_cell (e.g. {'ast_globals': True}).
+        jobs (int): Number of processes that convert the code cells of the notebook.
+        assets_dir (str): Optional directory where the attachments and embedded images of the markdown cells are saved.
+        assets_prefix (str): The path used to reference the saved assets (by default, assets_dir).
+        keep_sections (list): Optional list of section names to keep, removing the rest of the numbered sections.
+        install_commands (list): Optional list where the removed installation commands are added.
+
+    Returns:
+        bytes: The transformed notebook.
+    """
+    destination = io.BytesIO()
+    transform_file(io.BytesIO(data), destination, remove_sections=remove_sections, cache=cache,
+                   stream=stream, profiler=profiler, writer=writer, code_options=code_options, jobs=jobs,
+                   assets_dir=assets_dir, assets_prefix=assets_prefix, keep_sections=keep_sections,
+                   install_commands=install_commands)
+    return destination.getvalue()
+
+def transform_nb(path_original_nb, path_new_nb, remove_sections=[], cache=None, stream=False, profiler=null_profiler,
+                 writer=write_notebook, code_options=None, jobs=1, assets_dir=None, keep_sections=None,
+                 install_commands=None):
+    """
+    Transforms a Jupyter notebook by converting code cells and markdown cells
+    according to specific rules and removes specified sections.
+
+    Args:
+        path_original_nb (str): Path to the original Jupyter notebook file.
+        path_new_nb (str): Path to the new transformed Jupyter notebook file.
+        remove_sections (list): List of section names to be removed.
+        cache (ConversionCache): Optional cache with the already converted cells.
+        stream (bool): Whether to read the cells one at a time, skipping their outputs.
+        profiler (Profiler): Optional profiler that measures each stage and cell
+            (when streaming, the reading of the cells is measured as part of the conversion).
+        writer (callable): Function that writes the notebook to the destination.
+        code_options (dict): Extra options of code_to_cell (e.g. {'ast_globals': True}).
+        jobs (int): Number of processes that convert the code cells of the notebook.
+        assets_dir (str): Optional directory where the attachments and embedded images of the markdown cells are saved.
+        keep_sections (list): Optional list of section names to keep, removing the rest of the numbered sections.
+        install_commands (list): Optional list where the removed installation commands are added.
+
+    Returns:
+        None
+    """
+    transform_file(path_original_nb, path_new_nb, remove_sections=remove_sections, cache=cache,
+                   stream=stream, profiler=profiler, writer=writer, code_options=code_options, jobs=jobs,
+                   assets_dir=assets_dir, keep_sections=keep_sections, install_commands=install_commands)
+
+def split_file(source, destination_prefix, level=1, stream=False, writer=write_notebook, **options):
+    """
+    Transforms a notebook read from a path or file-like object and writes one notebook per section
+    of the given level, named with the prefix and the section (e.g. prefix_2_1.ipynb for the section 2.1.).
+
+    Args:
+        source (str or file-like): Path to the original notebook file or file-like object with it.
+        destination_prefix (str): Path of the written notebooks, without the section and the extension.
+        level (int): The depth of the sections to split (1 for the top level sections).
+        stream (bool): Whether to read the cells one at a time, skipping their outputs.
+        writer (callable): Function that writes each notebook.
+        **options: The rest of the arguments of convert_notebook (e.g. remove_sections or cache).
+
+    Returns:
+        list: The paths of the written notebooks.
+    """
+    if options.get("assets_dir") is not None and options.get("assets_prefix") is None:
+        options["assets_prefix"] = os.path.relpath(options["assets_dir"], os.path.dirname(os.path.abspath(destination_prefix)))
+
+    paths = []
+    for section, section_nb in split_notebook(read_cells(source, stream=stream), level=level, **options):
+        path = f"{destination_prefix}_{section.name.rstrip('.').replace('.', '_')}.ipynb"
+        writer(section_nb, path)
+        paths.append(path)
+    return paths
+
+def colabless_path(path_original_nb):
+    """
+    Builds the path of the transformed notebook, placed next to the original one.
+
+    Args:
+        path_original_nb (str): Path to the original Jupyter notebook file.
+
+    Returns:
+        str: Path of the 'colabless' version of the notebook.
+    """
+    folder, name = os.path.split(path_original_nb)
+    return os.path.join(folder, "colabless_" + name)
+
+def find_notebooks(inputs, recursive=False):
+    """
+    Collects the notebooks to transform from a list of files, directories or glob patterns.
+    Notebooks that are already the result of a transformation (colabless_*) are skipped.
+
+    Args:
+        inputs (list): List of notebook paths, directories or glob patterns.
+        recursive (bool): Whether to also look inside the subdirectories.
+
+    Returns:
+        list: Sorted list of the notebook paths found (without duplicates).
+    """
+    notebooks = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            # All the notebooks in the directory (and subdirectories if recursive)
+            pattern = os.path.join(item, "**", "*.ipynb") if recursive else os.path.join(item, "*.ipynb")
+            candidates = glob.glob(pattern, recursive=recursive)
+        else:
+            # A single notebook or a glob pattern
+            candidates = glob.glob(item, recursive=recursive)
+
+        for candidate in candidates:
+            if candidate.endswith(".ipynb") and not os.path.basename(candidate).startswith("colabless_"):
+                notebooks.add(os.path.normpath(candidate))
+
+    return sorted(notebooks)
+
+# Caches opened by the current process, so that each worker of the batch mode opens them only once
+_open_caches = {}
+
+def _get_cache(cache_path, cache_bytes):
+    """
+    Opens the cache of the given path (or reuses it if the current process already opened it).
+
+    Args:
+        cache_path (str): Path of the cache database (if None, no cache is used).
+        cache_bytes (int): Maximum size of the cache, in bytes.
+
+    Returns:
+        ConversionCache: The opened cache or None.
+    """
+    if cache_path is None:
+        return None
+    if cache_path not in _open_caches:
+        _open_caches[cache_path] = ConversionCache(cache_path, max_bytes=cache_bytes)
+    return _open_caches[cache_path]
+
+def _transform_job(path_original_nb, remove_sections, cache_path=None, cache_bytes=None, stream=False,
+                   writer=write_notebook, code_options=None, assets_dir=None, keep_sections=None,
+                   collect_installs=False):
+    """
+    Transforms a single notebook for the batch mode, catching any error so that
+    one malformed notebook does not stop the whole batch.
+
+    Args:
+        path_original_nb (str): Path to the original Jupyter notebook file.
+        remove_sections (list): List of section names to be removed.
+        cache_path (str): Path of the cache database (if None, no cache is used).
+        cache_bytes (int): Maximum size of the cache, in bytes.
+        stream (bool): Whether to read the cells one at a time, skipping their outputs.
+        writer (callable): Function that writes the notebook to the destination.
+        code_options (dict): Extra options of code_to_cell (e.g. {'ast_globals': True}).
+        assets_dir (str): Optional directory where the attachments and embedded images of the markdown cells are saved.
+        keep_sections (list): Optional list of section names to keep, removing the rest of the numbered sections.
+        collect_installs (bool): Whether to add the removed installation commands to the summary.
+
+    Returns:
+        dict: Summary of the transformation (paths, status, error, elapsed time, cache hits and misses
+        and, if the notebook is transformed, the installation commands if they are collected).
+    """
+    path_new_nb = colabless_path(path_original_nb)
+    start = time.perf_counter()
+    cache = None
+    install_commands = [] if collect_installs else None
+    try:
+        cache = _get_cache(cache_path, cache_bytes)
+        hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+        transform_nb(path_original_nb, path_new_nb, remove_sections=remove_sections, cache=cache, stream=stream,
+                     writer=writer, code_options=code_options, assets_dir=assets_dir, keep_sections=keep_sections,
+                     install_commands=install_commands)
+        status, error = "success", None
+    except Exception as e:
+        status, error = "failure", f"{type(e).__name__}: {e}"
+    summary = {"notebook": path_original_nb,
+               "output": path_new_nb,
+               "status": status,
+               "error": error,
+               "seconds": time.perf_counter() - start}
+    if cache is not None:
+        summary["cache_hits"] = cache.hits - hits
+        summary["cache_misses"] = cache.misses - misses
+    if install_commands is not None and status == "success":
+        summary["install_commands"] = install_commands
+    return summary
+
+def transform_batch(notebooks, remove_sections=[], workers=None, cache_path=None, cache_bytes=256 * 1024 * 1024,
+                    stream=False, writer=write_notebook, code_options=None, assets_dir=None, keep_sections=None,
+                    collect_installs=False):
+    """
+    Transforms a list of notebooks in parallel using a pool of processes.
+
+    Args:
+        notebooks (list): List of paths to the original Jupyter notebook files.
+        remove_sections (list): List of section names to be removed from every notebook.
+        workers (int): Number of worker processes (by default, the number of CPUs).
+        cache_path (str): Path of the cache database shared by the workers (if None, no cache is used).
+        cache_bytes (int): Maximum size of the cache, in bytes.
+        stream (bool): Whether to read the cells one at a time, skipping their outputs.
+        writer (callable): Function that writes each notebook (it needs to be picklable to use several workers).
+        code_options (dict): Extra options of code_to_cell (e.g. {'ast_globals': True}).
+        assets_dir (str): Optional directory where the attachments and embedded images of the markdown cells
+            are saved (the same image is only saved once for the whole batch).
+        keep_sections (list): Optional list of section names to keep in every notebook, removing the rest of the numbered sections.
+        collect_installs (bool): Whether to add the removed installation commands to the summary of each notebook.
+
+    Returns:
+        list: A summary (dict) per notebook, in the same order as the given notebooks.
+    """
+    if workers == 1 or len(notebooks) <= 1:
+        # No need to pay for the pool of processes
+        return [_transform_job(nb, remove_sections, cache_path, cache_bytes, stream, writer, code_options, assets_dir,
+                               keep_sections, collect_installs) for nb in notebooks]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Big chunks reduce the communication between processes when there are many small notebooks
+        chunksize = max(1, len(notebooks) // ((workers or os.cpu_count() or 1) * 4))
+        return list(executor.map(_transform_job, notebooks, 
+                                 [remove_sections] * len(notebooks),
+                                 [cache_path] * len(notebooks),
+                                 [cache_bytes] * len(notebooks),
+                                 [stream] * len(notebooks),
+                                 [writer] * len(notebooks),
+                                 [code_options] * len(notebooks),
+                                 [assets_dir] * len(notebooks),
+                                 [keep_sections] * len(notebooks),
+                                 [collect_installs] * len(notebooks), chunksize=chunksize))
+
+def write_docker_files(notebook_commands, context_dir, base_image=None):
+    """
+    Writes the Dockerfile and the requirements/environment files with the installation commands removed
+    from the notebooks, and reports the packages with conflicting versions and what could not be parsed.
+
+    Args:
+        notebook_commands (dict): The list of InstallCommand of each notebook (by its path).
+        context_dir (str): The directory where the files are written.
+        base_image (str): The base image of the Dockerfile (by default, chosen from the needed package managers).
+
+    Returns:
+        list: The paths of the written files.
+    """
+    dependencies = merge_dependencies(notebook_commands)
+    for conflict in dependencies["conflicts"]:
+        print(f"Docker: {conflict['package']} is requested as {', '.join(conflict['requirements'])}, "
+              f"using {conflict['selected']}", file=sys.stderr)
+    for unresolved in dependencies["unresolved"]:
+        print(f"Docker: install it by hand: {unresolved}", file=sys.stderr)
+    return write_docker_context(dependencies, context_dir, base_image=base_image)
+
+def write_batch_summary(summary, path_summary):
+    """
+    Saves the summary of a batch transformation as a JSON file.
+
+    Args:
+        summary (list): The summary returned by transform_batch.
+        path_summary (str): Path of the JSON file.
+
+    Returns:
+        None
+    """
+    succeeded = sum(1 for job in summary if job["status"] == "success")
+    skipped = sum(1 for job in summary if job["status"] == "skipped")
+    with open(path_summary, "w") as f:
+        json.dump({"total": len(summary),
+                   "succeeded": succeeded,
+                   "failed": len(summary) - succeeded - skipped,
+                   "skipped": skipped,
+                   "seconds": sum(job["seconds"] for job in summary),
+                   "notebooks": summary}, f, indent=2)
+
+def report_batch(summary, path_summary=None, docker_dir=None, base_image=None):
+    """
+    Prints the result of each notebook of a batch, and saves the summary and the Docker build context if requested.
+
+    Args:
+        summary (list): The summary returned by transform_batch (with the installation commands if docker_dir is given).
+        path_summary (str): Optional path of the JSON file where the summary is saved.
+        docker_dir (str): Optional directory where the Dockerfile is written.
+        base_image (str): The base image of the Dockerfile.
+
+    Returns:
+        None
+    """
+    if docker_dir:
+        # The commands are only written in the Dockerfile, not in the summary
+        install_commands = {job["notebook"]: job.pop("install_commands", None) for job in summary}
+        notebook_commands = {notebook: commands for notebook, commands in install_commands.items()
+                             if commands is not None}
+        write_docker_files(notebook_commands, docker_dir, base_image=base_image)
+    for job in summary:
+        if job["status"] == "success":
+            print(f"[OK]   {job['notebook']} ({job['seconds']:.3f}s)")
+        elif job["status"] == "skipped":
+            print(f"[SKIP] {job['notebook']}: {job['error']}")
+        else:
+            print(f"[FAIL] {job['notebook']} ({job['seconds']:.3f}s): {job['error']}")
+    if path_summary:
+        write_batch_summary(summary, path_summary)
 
 def main():
-    import os
     import argparse
  
     parser = argparse.ArgumentParser(description="Convert colab notebook to docker notebook",
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument("-p", "--path", help="path of the notebook")
-    parser.add_argument("-n", "--name", help="name of the notebook")
+    parser.add_argument("-n", "--name", help="name of the notebook ('-' to read it from stdin and write the result to stdout)")
     parser.add_argument("-s", "--sections", help="list with the sections to temove", nargs='+', default = [])
+    parser.add_argument("--keep-sections", help="list with the only sections to keep (with their subsections)", nargs='+')
+    parser.add_argument("--list-sections", help="print the numbered sections of the transformed notebook instead of writing it", action="store_true")
+    parser.add_argument("--split-by-section", help="write a notebook per section of this level (1 for the top level sections)", type=int, metavar="LEVEL")
+    parser.add_argument("-b", "--batch", help="notebooks, directories or glob patterns to transform in batch mode", nargs='+')
+    parser.add_argument("-a", "--archive", help="zip or tar archive whose notebooks are transformed into another archive (given by its path and format)",
+                        nargs=2, metavar=("SOURCE", "DESTINATION"))
+    parser.add_argument("-r", "--recursive", help="look for notebooks in subdirectories (batch mode)", action="store_true")
+    parser.add_argument("--watch", help="keep watching the notebooks (of --batch or --path and --name) and transform them again when they change", action="store_true")
+    parser.add_argument("-w", "--workers", help="number of worker processes (batch mode), by default the number of CPUs", type=int)
+    parser.add_argument("--summary", help="JSON file where the batch summary is saved (batch and archive modes)")
+    parser.add_argument("--cache", help="SQLite file used as persistent cache of the converted cells")
+    parser.add_argument("--cache-size", help="maximum size of the cache in MB", type=int, default=256)
+    parser.add_argument("--stream", help="read the cells one at a time skipping their outputs (for very large notebooks)", action="store_true")
+    parser.add_argument("-j", "--jobs", help="number of processes that convert the cells of the notebook (single notebook mode)", type=int, default=1)
+    parser.add_argument("--ast-globals", help="find the variables that need to be global parsing each cell with ast", action="store_true")
+    parser.add_argument("--widget-runtime", help="add the button of the cells with parameters with a shared helper cell instead of repeating it in every cell", action="store_true")
+    parser.add_argument("--memoize", help="number of runs of each cell with parameters saved by the values of its widgets, restored instead of running it again with the same values (implies --widget-runtime)", type=int, default=0)
+    parser.add_argument("--assets", help="directory where the attachments and embedded images of the markdown cells are saved")
+    parser.add_argument("--docker", help="directory where a Dockerfile with the removed pip and conda installs is written")
+    parser.add_argument("--base-image", help="base image of the Dockerfile (by default python or miniconda, depending on the installs)")
+    parser.add_argument("--fast-write", help="write the notebook without validating it against the schema", action="store_true")
+    parser.add_argument("--compact", help="write the notebook as compact JSON, without indentation (with --fast-write)", action="store_true")
+    parser.add_argument("--validate-ratio", help="proportion of notebooks validated against the schema (with --fast-write)", type=float, default=0.0)
+    parser.add_argument("--profile", help="file where the time of each stage and cell is saved (single notebook mode)")
+    parser.add_argument("--profile-format", help="format of the profile file", choices=["json", "chrome"], default="json")
     args = vars(parser.parse_args())
-    
-    path_original_nb = os.path.join(args["path"], args["name"])
-    path_new_nb = os.path.join(args["path"], "colabless_" + args["name"])
-    transform_nb(path_original_nb, path_new_nb, remove_sections = args["sections"])
+
+    if args["fast_write"]:
+        writer = partial(fast_write_notebook, compact=args["compact"], validate_ratio=args["validate_ratio"])
+    else:
+        writer = write_notebook
+    code_options = {}
+    if args["ast_globals"]:
+        code_options["ast_globals"] = True
+    if args["widget_runtime"] or args["memoize"]:
+        code_options["widget_runtime"] = True
+    if args["memoize"]:
+        code_options["memoize"] = args["memoize"]
+
+    if args["watch"]:
+        from watcher import NotebookWatcher
+
+        if args["batch"]:
+            inputs = args["batch"]
+        elif args["path"] and args["name"] and args["name"] != "-":
+            inputs = [os.path.join(args["path"], args["name"])]
+        else:
+            parser.error("--watch needs --batch or --path and --name")
+        watcher = NotebookWatcher(inputs, recursive=args["recursive"], remove_sections=args["sections"],
+                                  cache=_get_cache(args["cache"], args["cache_size"] * 1024 * 1024), writer=writer,
+                                  code_options=code_options, assets_dir=args["assets"])
+        try:
+            watcher.watch()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args["archive"]:
+        from archive import transform_archive
+
+        if args["assets"]:
+            parser.error("--assets cannot be used with --archive")
+        summary = transform_archive(*args["archive"], remove_sections=args["sections"],
+                                    cache=_get_cache(args["cache"], args["cache_size"] * 1024 * 1024),
+                                    stream=args["stream"], writer=writer, code_options=code_options,
+                                    keep_sections=args["keep_sections"], collect_installs=args["docker"] is not None)
+        report_batch(summary, path_summary=args["summary"], docker_dir=args["docker"], base_image=args["base_image"])
+        return
+
+    if args["batch"]:
+        notebooks = find_notebooks(args["batch"], recursive=args["recursive"])
+        summary = transform_batch(notebooks, remove_sections=args["sections"], workers=args["workers"],
+                                  cache_path=args["cache"], cache_bytes=args["cache_size"] * 1024 * 1024,
+                                  stream=args["stream"], writer=writer, code_options=code_options,
+                                  assets_dir=args["assets"], keep_sections=args["keep_sections"],
+                                  collect_installs=args["docker"] is not None)
+        report_batch(summary, path_summary=args["summary"], docker_dir=args["docker"], base_image=args["base_image"])
+        return
+
+    if args["name"] == "-":
+        # The notebook is read from the standard input and the result is written to the standard output
+        source, destination = sys.stdin.buffer, sys.stdout.buffer
+    elif args["path"] and args["name"]:
+        source = os.path.join(args["path"], args["name"])
+        destination = os.path.join(args["path"], "colabless_" + args["name"])
+    else:
+        parser.error("either --path and --name, --name - or --batch are required")
+
+    cache = _get_cache(args["cache"], args["cache_size"] * 1024 * 1024)
+
+    if args["list_sections"]:
+        new_nb, section_localizer = convert_notebook(read_cells(source, stream=args["stream"]),
+                                                     remove_sections=args["sections"], cache=cache,
+                                                     code_options=code_options, jobs=args["jobs"],
+                                                     keep_sections=args["keep_sections"])
+        for section in list_sections(new_nb.cells, section_localizer):
+            print(f"{'  ' * (section.depth - 1)}{section.name} {section.heading} (cells {section.start}-{section.end - 1})")
+        return
+
+    if args["split_by_section"]:
+        if args["name"] == "-":
+            parser.error("--split-by-section needs --path and --name")
+        paths = split_file(source, os.path.splitext(destination)[0], level=args["split_by_section"],
+                           stream=args["stream"], writer=writer, remove_sections=args["sections"], cache=cache,
+                           code_options=code_options, jobs=args["jobs"], assets_dir=args["assets"],
+                           keep_sections=args["keep_sections"])
+        for path in paths:
+            print(path)
+        return
+
+    profiler = Profiler() if args["profile"] else null_profiler
+    install_commands = [] if args["docker"] else None
+    transform_file(source, destination, remove_sections = args["sections"], cache=cache, stream=args["stream"],
+                   profiler=profiler, writer=writer, code_options=code_options, jobs=args["jobs"],
+                   assets_dir=args["assets"], keep_sections=args["keep_sections"], install_commands=install_commands)
+    if args["docker"]:
+        write_docker_files({args["name"]: install_commands}, args["docker"], base_image=args["base_image"])
+    if args["profile"]:
+        profiler.save(args["profile"], trace_format=args["profile_format"])
+    if cache is not None:
+        print(f"Cache: {cache.stats()}", file=sys.stderr)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,163 @@
+import io
+import os
+import sys
+import time
+import hashlib
+
+from cache import ConversionCache
+from transform import find_notebooks, colabless_path, transform_file, write_notebook, convert_notebook, read_cells
+
+class NotebookWatcher:
+    """
+    Watches notebooks (polling the modification time and size of their files) and transforms them again when
+    their content changes. The bursts of changes (e.g. an editor saving several times) are debounced, the notebooks
+    whose content hash did not change are skipped, and the cells whose source did not change are reused from
+    the cache (an in-memory one if no cache is given).
+
+    Args:
+        inputs (list): List of notebook paths, directories or glob patterns.
+        recursive (bool): Whether to also look inside the subdirectories.
+        remove_sections (list): List of section names to be removed from every notebook.
+        cache (ConversionCache): Optional cache with the already converted cells.
+        writer (callable): Function that writes the notebook to the destination.
+        code_options (dict): Extra options of code_to_cell (e.g. {'ast_globals': True}).
+        assets_dir (str): Optional directory where the attachments and embedded images of the markdown cells are saved.
+        interval (float): Seconds between two scans of the files.
+        debounce (float): Seconds without new changes before transforming the changed notebooks.
+        log (file-like): Text file where a line is written for each transformed notebook.
+    """
+
+    def __init__(self, inputs, recursive=False, remove_sections=[], cache=None, writer=write_notebook,
+                 code_options=None, assets_dir=None, interval=0.1, debounce=0.2, log=sys.stderr):
+        self.inputs = inputs
+        self.recursive = recursive
+        self.remove_sections = remove_sections
+        self.cache = cache if cache is not None else ConversionCache(":memory:")
+        self.writer = writer
+        self.code_options = code_options
+        self.assets_dir = assets_dir
+        self.interval = interval
+        self.debounce = debounce
+        self.log = log
+
+        # Modification time and size of each file, and hash of the content of each transformed notebook
+        self.file_stats = {}
+        self.hashes = {}
+
+    def scan(self):
+        """
+        Returns:
+            dict: The modification time (in nanoseconds) and size of each watched notebook.
+        """
+        file_stats = {}
+        for path in find_notebooks(self.inputs, recursive=self.recursive):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Removed between the search and the stat
+                continue
+            file_stats[path] = (stat.st_mtime_ns, stat.st_size)
+        return file_stats
+
+    def convert(self, path, detected):
+        """
+        Transforms a notebook if the hash of its content changed since its last transformation.
+
+        Args:
+            path (str): Path of the notebook.
+            detected (float): Value of time.time() when the change was detected.
+
+        Returns:
+            bool: Whether the notebook was transformed.
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+
+        content_hash = hashlib.sha256(data).hexdigest()
+        if self.hashes.get(path) == content_hash:
+            # Only the modification time changed
+            return False
+
+        start = time.perf_counter()
+        hits = self.cache.hits
+        try:
+            transform_file(io.BytesIO(data), colabless_path(path), remove_sections=self.remove_sections,
+                           cache=self.cache, writer=self.writer, code_options=self.code_options,
+                           assets_dir=self.assets_dir)
+        except Exception as e:
+            print(f"[FAIL] {path}: {type(e).__name__}: {e}", file=self.log, flush=True)
+            return False
+
+        self.hashes[path] = content_hash
+        print(f"[OK]   {path} ({time.perf_counter() - start:.3f}s, {time.time() - detected:.3f}s since the change, "
+              f"{self.cache.hits - hits} cells reused)", file=self.log, flush=True)
+        return True
+
+    def start(self):
+        """
+        Records the current state of the notebooks, transforming the ones whose result is missing or older.
+        The notebooks whose result is up to date are converted without writing them, so that their cells are
+        in the cache and the first change only converts the cells that changed.
+
+        Returns:
+            None
+        """
+        self.file_stats = self.scan()
+        for path, (mtime_ns, _) in self.file_stats.items():
+            output = colabless_path(path)
+            if not os.path.exists(output) or os.stat(output).st_mtime_ns < mtime_ns:
+                self.convert(path, time.time())
+            else:
+                # Hashed, so that saving it without changes does not transform it again
+                with open(path, "rb") as f:
+                    data = f.read()
+                self.hashes[path] = hashlib.sha256(data).hexdigest()
+                try:
+                    convert_notebook(read_cells(io.BytesIO(data)), remove_sections=self.remove_sections,
+                                     cache=self.cache, code_options=self.code_options)
+                except Exception:
+                    # The error is reported if the notebook is transformed after a change
+                    pass
+
+    def poll(self):
+        """
+        Scans the notebooks once and, if any of them changed, waits until the changes stop
+        for the debounce time and transforms the changed ones.
+
+        Returns:
+            list: The paths of the transformed notebooks.
+        """
+        file_stats = self.scan()
+        if file_stats == self.file_stats:
+            return []
+
+        detected = time.time()
+        # Debounce: wait until there are no more changes
+        stable_since = detected
+        while time.time() - stable_since < self.debounce:
+            time.sleep(self.interval)
+            new_file_stats = self.scan()
+            if new_file_stats != file_stats:
+                file_stats, stable_since = new_file_stats, time.time()
+
+        changed = [path for path, stat in file_stats.items() if self.file_stats.get(path) != stat]
+        for path in set(self.hashes) - set(file_stats):
+            # Removed notebooks
+            del self.hashes[path]
+        self.file_stats = file_stats
+        return [path for path in changed if self.convert(path, detected)]
+
+    def watch(self):
+        """
+        Transforms the notebooks every time they change, until it is interrupted.
+
+        Returns:
+            None
+        """
+        self.start()
+        while True:
+            self.poll()
+            time.sleep(self.interval)
@@ -0,0 +1,65 @@
+# Run this cell to load the helpers used by the cells with parameters
+import sys
+import ipywidgets as widgets
+from IPython.display import display, clear_output
+
+# Registry of the cells with parameters: the name of their function to their widgets and run callback
+colab_cells = {}
+
+# Saved runs of the cells with memoize, by the name of their function (kept when this cell runs again)
+colab_memo = globals().get('colab_memo', {})
+
+def _save_last_run(memo, memoize):
+    # The output of a run is synced from the browser after the run finishes, so it is saved at the next click
+    last_run = memo.pop("last_run", None)
+    if last_run is None or any(out.get('output_type') == 'error' for out in last_run["output"].outputs):
+        return
+    memo["runs"][last_run["key"]] = (last_run["globals"], last_run["output"].outputs)
+    while len(memo["runs"]) > memoize:
+        # The least recently used run is evicted
+        del memo["runs"][next(iter(memo["runs"]))]
+
+def run_button(*cell_widgets, memoize=0, global_names=()):
+    """
+    Decorator for the code of a cell with parameters: it displays a 'Load and run' button under the widgets
+    of the cell that calls the decorated function, showing its output below the button.
+    The widgets and the callback are registered in colab_cells with the name of the function.
+    With memoize, the last runs (up to memoize of them) are saved by the values of the widgets, and clicking
+    the button with the same values restores the global variables (global_names) and the output of that run
+    instead of running the code again (the values are not copied, they are the same objects).
+    """
+    def decorator(function):
+        output = widgets.Output()
+        cached = widgets.Label()
+        memo = colab_memo.setdefault(function.__name__, {"runs": {}})
+
+        def run(_=None):
+            if memoize:
+                _save_last_run(memo, memoize)
+                key = tuple(repr(widget.value) for widget in cell_widgets)
+                if key in memo["runs"]:
+                    # Moved to the end, as the most recently used
+                    saved_globals, outputs = memo["runs"][key] = memo["runs"].pop(key)
+                    function.__globals__.update(saved_globals)
+                    output.outputs = outputs
+                    cached.value = '(cached: the parameters did not change)'
+                    return
+                cached.value = ''
+
+            output.clear_output()
+            with output:
+                function()
+                # In case there is any plot, so that it can be displayed
+                if 'matplotlib.pyplot' in sys.modules:
+                    sys.modules['matplotlib.pyplot'].show()
+            if memoize:
+                memo["last_run"] = {"key": key, "output": output,
+                                    "globals": {name: function.__globals__[name] for name in global_names
+                                                if name in function.__globals__}}
+
+        button = widgets.Button(description='Load and run')
+        button.on_click(run)
+        display(widgets.HBox([button, cached]) if memoize else button, output)
+        colab_cells[function.__name__] = {"widgets": cell_widgets, "run": run}
+        return function
+    return decorator
@@ -0,0 +1,45 @@
+import io
+
+import nbformat
+import pytest
+
+import fast_writer
+from fast_writer import dumps_notebook, fast_write_notebook
+from synthetic import make_colab_notebook
+from transform import transform_notebook
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    # Both the orjson path (when it is installed) and the fallback to the json library
+    if request.param == "orjson":
+        if fast_writer.orjson is None:
+            pytest.skip("orjson is not installed")
+    else:
+        monkeypatch.setattr(fast_writer, "orjson", None)
+    return request.param
+
+@pytest.fixture(scope="module")
+def new_nb():
+    return transform_notebook(make_colab_notebook(num_sections=5, seed=1))
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_round_trip(backend, new_nb, compact):
+    destination = io.BytesIO()
+    fast_write_notebook(new_nb, destination, compact=compact)
+    destination.seek(0)
+    read_nb = nbformat.read(io.TextIOWrapper(destination, encoding="utf-8"), as_version=4)
+    nbformat.validate(read_nb)
+    assert read_nb == new_nb
+
+def test_text_destination(backend, new_nb):
+    destination = io.StringIO()
+    fast_write_notebook(new_nb, destination)
+    assert nbformat.reads(destination.getvalue(), as_version=4) == new_nb
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_same_output_with_and_without_orjson(new_nb, compact, monkeypatch):
+    if fast_writer.orjson is None:
+        pytest.skip("orjson is not installed")
+    with_orjson = dumps_notebook(new_nb, compact=compact)
+    monkeypatch.setattr(fast_writer, "orjson", None)
+    assert dumps_notebook(new_nb, compact=compact) == with_orjson
@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from benchmark import legacy_parse_param_line, adversarial_param_lines
+from param_parser import parse_param_line
+from synthetic import param_lines
+
+# Pieces used to build random lines with @param, with the tricky characters of the format
+param_line_pieces = ['x', 'var_1', ' ', '  ', '\t', '=', '#@param', '#', '[', ']', '{', '}', '"a"', "'b'", ',', ':',
+                     '1', '-2', '+3.5', '.5', '5.', 'min:', 'max:', 'step:', '{type:', '"raw"', '"slider"',
+                     '{allow-input:', 'true}', ' # comment', 'é', '\n', 'min:0, max:10, step:1', '{type:"string"}',
+                     '["a", "b"]', '{allow-input: true}']
+
+def random_param_lines(num_lines, seed):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(num_lines):
+        line = ''.join(rng.choice(param_line_pieces) for _ in range(rng.randint(0, 16)))
+        if rng.random() < 0.5:
+            line = 'x = 1 ' + line + rng.choice(['', ' #@param', ' #@param {type:"slider", min:0, max:10, step:1}'])
+        lines.append(line)
+    return lines
+
+def assert_same_as_legacy(lines):
+    # The tokenizer needs to give the same result as the regular expressions it replaces
+    mismatches = [line for line in lines
+                  if (tuple(info) if (info := parse_param_line(line)) else None) != legacy_parse_param_line(line)]
+    assert mismatches == []
+
+def test_every_param_form():
+    lines = [line.format(i=i) for i, line in enumerate(param_lines)]
+    assert all(parse_param_line(line) is not None for line in lines)
+    assert_same_as_legacy(lines)
+
+@pytest.mark.parametrize("seed", range(4))
+def test_random_lines(seed):
+    assert_same_as_legacy(random_param_lines(5000, seed))
+
+def test_adversarial_lines():
+    # Short enough for the regular expressions, which backtrack on them
+    assert_same_as_legacy(list(adversarial_param_lines(200).values()))
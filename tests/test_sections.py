@@ -0,0 +1,31 @@
+import nbformat
+import pytest
+
+from sections import split_sections
+
+sources = ['setup', '# 1. A', 'a', '## 1.1. x', 'x', '## 1.2. y', 'y', '# 2. B', 'b', '# 3. C', 'c', '### 3.1.1. z', 'z']
+
+@pytest.fixture
+def notebook():
+    cells = [nbformat.v4.new_markdown_cell(source) for source in sources]
+    section_localizer = {source.split()[1]: i for i, source in enumerate(sources) if source.startswith('#')}
+    return cells, section_localizer
+
+def split(notebook, level):
+    return {section.name: [cell.source for cell in cells] for section, cells in split_sections(*notebook, level)}
+
+def test_split_by_top_level_sections(notebook):
+    parts = split(notebook, 1)
+    assert list(parts) == ['1.', '2.', '3.']
+    assert parts['2.'] == ['setup', '# 2. B', 'b']
+
+def test_sections_without_subsections_are_their_own_part(notebook):
+    parts = split(notebook, 2)
+    assert list(parts) == ['1.1.', '1.2.', '2.', '3.']
+    assert parts['1.2.'] == ['setup', '# 1. A', 'a', '## 1.2. y', 'y']
+    assert parts['3.'] == ['setup', '# 3. C', 'c', '### 3.1.1. z', 'z']
+
+def test_deeper_sections_get_the_introduction_of_their_ancestors(notebook):
+    parts = split(notebook, 3)
+    assert list(parts) == ['1.1.', '1.2.', '2.', '3.1.1.']
+    assert parts['3.1.1.'] == ['setup', '# 3. C', 'c', '### 3.1.1. z', 'z']
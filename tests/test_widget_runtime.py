@@ -0,0 +1,174 @@
+import io
+import sys
+import types
+import contextlib
+
+import pytest
+
+from code_utils_one_cell import code_to_cell
+
+# Cell whose body records each run, defines a global and prints it (and fails with a negative value)
+cell_code = '''epochs = 10 #@param {type:"integer"}
+runs.append(epochs)
+model = f"model-{epochs}"
+print(model)
+if epochs < 0:
+    raise ValueError("negative epochs")'''
+
+class Widget:
+    def __init__(self, *children, value=None, **kwargs):
+        self.children = children[0] if children else []
+        self.value = value
+
+class Button(Widget):
+    def on_click(self, callback):
+        self.callback = callback
+
+    def click(self):
+        self.callback(self)
+
+class Output(Widget):
+    """
+    Output that records what is printed inside it, like the outputs synced from the browser,
+    and shows the errors instead of raising them, like in a kernel.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.outputs = ()
+
+    def clear_output(self):
+        self.outputs = ()
+
+    def __enter__(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def __exit__(self, exc_type, exc, traceback):
+        text = sys.stdout.getvalue()
+        self.stdout.__exit__(None, None, None)
+        if text:
+            self.outputs += ({"output_type": "stream", "name": "stdout", "text": text},)
+        if exc_type is not None:
+            self.outputs += ({"output_type": "error", "ename": exc_type.__name__, "evalue": str(exc)},)
+        return True
+
+@pytest.fixture
+def stub_modules(monkeypatch):
+    widgets = types.ModuleType("ipywidgets")
+    for name in ("IntText", "FloatText", "Text", "Label", "HBox"):
+        setattr(widgets, name, type(name, (Widget,), {}))
+    widgets.Button, widgets.Output = Button, Output
+
+    displayed = []
+    display = types.ModuleType("IPython.display")
+    display.display = lambda *objects: displayed.extend(objects)
+    display.clear_output = lambda: None
+    ipython = types.ModuleType("IPython")
+    ipython.display = display
+
+    monkeypatch.setitem(sys.modules, "ipywidgets", widgets)
+    monkeypatch.setitem(sys.modules, "IPython", ipython)
+    monkeypatch.setitem(sys.modules, "IPython.display", display)
+    return displayed
+
+def run_cells(code, memoize, namespace, displayed):
+    """
+    Executes the cells generated by code_to_cell in the namespace, like a notebook does.
+
+    Returns:
+        tuple: The widget of the parameter, the button, the 'cached' label and the output of the cell.
+    """
+    new_cells, _ = code_to_cell(code, False, 'function', widget_runtime=True, memoize=memoize)
+    displayed.clear()
+    for cell in new_cells:
+        exec(cell.source, namespace)
+    box, output = displayed[-2:]
+    button, cached = box.children
+    return namespace["widget_epochs"], button, cached, output
+
+@pytest.fixture
+def notebook(stub_modules):
+    namespace = {"runs": []}
+    return namespace, run_cells(cell_code, 2, namespace, stub_modules)
+
+def test_first_click_runs(notebook):
+    namespace, (widget, button, cached, output) = notebook
+    button.click()
+    assert namespace["runs"] == [10]
+    assert namespace["model"] == "model-10"
+    assert cached.value == ''
+
+def test_same_values_are_not_run_again(notebook):
+    namespace, (widget, button, cached, output) = notebook
+    button.click()
+    button.click()
+    assert namespace["runs"] == [10]
+    assert cached.value.startswith('(cached')
+
+def test_globals_and_output_are_restored(notebook):
+    namespace, (widget, button, cached, output) = notebook
+    button.click()
+    widget.value = 20
+    button.click()
+    assert namespace["model"] == "model-20"
+
+    widget.value = 10
+    button.click()
+    assert namespace["runs"] == [10, 20]
+    assert namespace["model"] == "model-10"
+    assert [out["text"] for out in output.outputs] == ["model-10\n"]
+    assert cached.value.startswith('(cached')
+
+@pytest.mark.parametrize("ast_globals", [False, True])
+def test_tuple_assignments_are_restored(stub_modules, ast_globals):
+    code = cell_code + '\nsize, tag = epochs * 2, f"t{epochs}"'
+    new_cells, _ = code_to_cell(code, False, 'function', ast_globals=ast_globals, widget_runtime=True, memoize=2)
+    namespace = {"runs": []}
+    for cell in new_cells:
+        exec(cell.source, namespace)
+    box, output = stub_modules[-2:]
+    button = box.children[0]
+    for value in (10, 20, 10):
+        namespace["widget_epochs"].value = value
+        button.click()
+    assert namespace["runs"] == [10, 20]
+    assert (namespace["model"], namespace["size"], namespace["tag"]) == ("model-10", 20, "t10")
+
+def test_least_recently_used_run_is_evicted(notebook):
+    namespace, (widget, button, cached, output) = notebook
+    for value in (10, 20, 10, 30):
+        widget.value = value
+        button.click()
+    # 20 was evicted when 30 was saved (10 was used more recently), 10 and 30 are kept
+    for value in (10, 30, 20):
+        widget.value = value
+        button.click()
+    assert namespace["runs"] == [10, 20, 30, 20]
+
+def test_failed_runs_are_not_saved(notebook):
+    namespace, (widget, button, cached, output) = notebook
+    widget.value = -1
+    button.click()
+    button.click()
+    assert namespace["runs"] == [-1, -1]
+    assert output.outputs[-1]["output_type"] == "error"
+    assert cached.value == ''
+
+def test_saved_runs_are_kept_when_the_cells_run_again(stub_modules):
+    namespace = {"runs": []}
+    widget, button, cached, output = run_cells(cell_code, 2, namespace, stub_modules)
+    button.click()
+    widget, button, cached, output = run_cells(cell_code, 2, namespace, stub_modules)
+    button.click()
+    assert namespace["runs"] == [10]
+    assert cached.value.startswith('(cached')
+
+def test_without_memoize_every_click_runs(stub_modules):
+    new_cells, _ = code_to_cell(cell_code, False, 'function', widget_runtime=True)
+    namespace = {"runs": []}
+    for cell in new_cells:
+        exec(cell.source, namespace)
+    button = stub_modules[-2]
+    button.click()
+    button.click()
+    assert namespace["runs"] == [10, 10]